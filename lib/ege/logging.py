@@ -1,4 +1,4 @@
-import logging, os, sys, time, inspect, datetime
+import json, logging, os, sys, threading, time, inspect, datetime
 from contextlib import contextmanager
 from functools import lru_cache
 
@@ -21,6 +21,126 @@ def human_time(seconds):
 
     return ' '.join(result[:2])
 
+def peak_rss():
+    """The most memory (in MB) this process, or any finished child of it, has held at once - None where we cannot tell"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # macOS counts bytes, linux kilobytes
+    scale = 1 if sys.platform == 'darwin' else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak * scale / 2**20, 1)
+
+
+class Span:
+    """One indented or timed section, and how many items it got through if anyone counted"""
+    def __init__(self, name, depth, **attributes):
+        self.name = name
+        self.depth = depth
+        self.attributes = attributes
+        self.items = None
+        self.pid = os.getpid()
+        self.thread = threading.current_thread()
+        self.start = time.time()
+        self.cpu = time.process_time()
+
+    def record(self, context):
+        """What the section took, as a dict that can be written out as json"""
+        wall = time.time() - self.start
+        audio = context.get('audio')
+        return {
+            'stage': self.name,
+            'depth': self.depth,
+            'start': round(self.start, 3),
+            'wall': round(wall, 3),
+            'cpu': round(time.process_time() - self.cpu, 3),
+            'peak_rss': peak_rss(),
+            **context,
+            'rtf': round(wall / audio, 4) if audio else None,
+            'items': self.items,
+            'items_per_sec': round(self.items / wall, 3) if self.items is not None and wall > 0 else None,
+        }
+
+
+class Metrics:
+    """
+    Machine-readable records of every section of a run, appended to a jsonl file
+
+    Every record has the stage name, wall and cpu seconds, the peak memory so
+    far, and whatever context the run was given (like the seconds of audio,
+    which gives the real-time factor). The last line of each run is a
+    summary with the totals for the run and for each stage.
+    """
+    def __init__(self, path, context):
+        self.path = path
+        self.context = context
+        self.records = []
+        self.lock = threading.Lock()
+        self.span = Span('total', 0)
+
+    def add(self, span):
+        self.write(span.record(self.context))
+
+    def write(self, record):
+        with self.lock:
+            self.records.append(record)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def summary(self):
+        """The totals for the whole run, and for each stage by name"""
+        stages = {}
+        for record in self.records:
+            stage = stages.setdefault(record['stage'], {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'items': None})
+            stage['count'] += 1
+            stage['wall'] = round(stage['wall'] + record['wall'], 3)
+            stage['cpu'] = round(stage['cpu'] + record['cpu'], 3)
+            if record['items'] is not None:
+                stage['items'] = (stage['items'] or 0) + record['items']
+        for stage in stages.values():
+            stage['items_per_sec'] = round(stage['items'] / stage['wall'], 3) if stage['items'] and stage['wall'] > 0 else None
+        return {**self.span.record(self.context), 'stage': 'summary', 'stages': stages}
+
+
+class Trace:
+    """
+    Every section as a Chrome trace event, for Perfetto or chrome://tracing
+
+    The file is the json array format, one event per line and left open at
+    the end (which both viewers accept). So worker processes can append
+    their own sections to the same file as they go, and they show up as
+    processes of their own in the timeline.
+    """
+    def __init__(self, path, fresh=True):
+        self.path = path
+        self.lock = threading.Lock()
+        self.threads = set()
+        if fresh:
+            with open(path, 'w') as f:
+                f.write('[\n')
+        # one write per line, so lines from different processes never mix
+        self.file = open(path, 'a', buffering=1)
+        self.write({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': f"{os.path.basename(sys.argv[0]) or 'python'} {os.getpid()}"}})
+
+    def write(self, event):
+        with self.lock:
+            self.file.write(json.dumps(event) + ',\n')
+
+    def add(self, span):
+        tid = span.thread.ident
+        if (span.pid, tid) not in self.threads:
+            self.threads.add((span.pid, tid))
+            self.write({'name': 'thread_name', 'ph': 'M', 'pid': span.pid, 'tid': tid, 'args': {'name': span.thread.name}})
+        args = {'depth': span.depth, 'cpu': round(time.process_time() - span.cpu, 6), **span.attributes}
+        if span.items is not None:
+            args['items'] = span.items
+        self.write({
+            'name': span.name, 'ph': 'X', 'pid': span.pid, 'tid': tid,
+            'ts': int(span.start * 1e6), 'dur': int((time.time() - span.start) * 1e6), 'args': args
+        })
+
+
 # Set up logging with a custom format
 class CustomFormatter(logging.Formatter):
     def __init__(self, start_time):
@@ -42,31 +162,77 @@ class CustomLogger(logging.getLoggerClass()):
     def __init__(self, name):
         super().__init__(name)
         self.indent_level = 0
+        self.sinks = []
+
+    @contextmanager
+    def metrics(self, path, **context):
+        """Write a record of every section inside the block to the jsonl file at path, and a summary at the end"""
+        metrics = Metrics(path, {'run': datetime.datetime.now().isoformat(timespec='seconds'), **context})
+        self.sinks.append(metrics)
+        try:
+            yield metrics
+        finally:
+            self.sinks.remove(metrics)
+        summary = metrics.summary()
+        metrics.write(summary)
+        self.summarize(summary)
+
+    def summarize(self, summary, top=8):
+        """Log where the time went"""
+        audio = f" for {format_elapsed_time(summary['audio'])} of audio ({summary['rtf']:.2f}x real time)" if summary.get('rtf') else ''
+        rss = f", peak {summary['peak_rss']:,.0f} MB" if summary['peak_rss'] is not None else ''
+        with self.indent(f"Took {format_elapsed_time(summary['wall'])}{audio}{rss}"):
+            stages = sorted(summary['stages'].items(), key=lambda kv: -kv[1]['wall'])
+            for name, stage in stages[:top]:
+                rate = f", {stage['items_per_sec']:,.1f}/sec" if stage['items_per_sec'] else ''
+                self.info(f"{name}: {stage['wall']:,.1f}s wall, {stage['cpu']:,.1f}s cpu{rate}")
+
+    def tracing(self, path, fresh=False):
+        """Write every section from now on to path as Chrome trace events - fresh starts the file over"""
+        for sink in self.sinks:
+            if isinstance(sink, Trace) and sink.path == path: return sink
+        trace = Trace(path, fresh)
+        self.sinks.append(trace)
+        return trace
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """A section that is only recorded (by metrics and traces), not logged"""
+        span = Span(name, self.indent_level // 2, **attributes)
+        yield span
+        self.record(span)
+
+    def record(self, span):
+        """Hand a finished section to every metrics block it is in"""
+        for sink in self.sinks:
+            sink.add(span)
 
     @contextmanager
     def indent(self, name, timer=False):
         """Create an indented section with optional timing summary"""
-        start = time.time()
+        span = Span(name, self.indent_level // 2)
         self.info(name)
         self.indent_level += 2
         try:
-            yield
+            yield span
         finally:
             self.indent_level -= 2
         end = time.time()
+        self.record(span)
         if timer:
-            elapsed = format_elapsed_time(end - start)
+            elapsed = format_elapsed_time(end - span.start)
             self.info(f'{name}: {elapsed} seconds')
 
     @contextmanager
     def timer(self, name):
         """Record how long something takes"""
-        start = time.time()
+        span = Span(name, self.indent_level // 2)
         #try:
-        yield
+        yield span
         #except
         end = time.time()
-        elapsed = format_elapsed_time(end - start)
+        self.record(span)
+        elapsed = format_elapsed_time(end - span.start)
         self.info(f'{name}: {elapsed}')
 
     def exit(self, message=None):
@@ -91,7 +257,7 @@ class CustomLogger(logging.getLoggerClass()):
 
     @contextmanager
     def progress(self, name, length, width=30):
-        with self.indent(name):
+        with self.indent(name) as span:
             progress_chars = width  # Set exact width
             start_time = time.time()
             last_update = time.time()  # Track last update time
@@ -132,9 +298,11 @@ class CustomLogger(logging.getLoggerClass()):
                         self.logger.info(progress_message)
                         self.last_update = current_time
 
+            progress = Progress(self, progress_chars, length)
             try:
-                yield Progress(self, progress_chars, length)
+                yield progress
             finally:
+                span.items = progress.completed_steps
                 elapsed_time = time.time() - start_time
                 self.info(f"{name} completed: {length:,} steps in {human_time(int(elapsed_time))}")
 
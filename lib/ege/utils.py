@@ -1,4 +1,5 @@
-import pprint, datetime, shutil, os
+import pprint, datetime, shutil, os, tempfile
+from contextlib import contextmanager
 from typing import List, Any, Union, Optional
 
 def format_elapsed_time(secs: Union[int, float]) -> str:
@@ -59,4 +60,21 @@ def greek_letters(num: int) -> str:
                     "nu", "xi", "omicron", "pi", "rho", "sigma",
                     "tau", "upsilon", "phi", "chi", "psi", "omega"]
   quotient, remainder = divmod(num, len(greek_alphabet))
-  return greek_alphabet[remainder] + (str(quotient) if quotient > 0 else "")
\ No newline at end of file
+  return greek_alphabet[remainder] + (str(quotient) if quotient > 0 else "")
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'wb'):
+  """
+    Open a file to write that only shows up under path once it is complete
+
+    It is written under a name of its own next to path and moved in place at
+    the end, so readers never see half a file and writers at the same time
+    never mix theirs. If the block fails, nothing is left behind.
+  """
+  fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+  try:
+    with os.fdopen(fd, mode) as f: yield f
+    os.replace(tmp, path)
+  except BaseException:
+    if os.path.exists(tmp): os.unlink(tmp)
+    raise
@@ -1,7 +1,11 @@
 __all__ = [
-  'cli',
-  'models', 'paths',
+  'audio', 'batch', 'cache', 'cli',
+  'diarization', 'emotions',
+  'library', 'manifest',
+  'models', 'onnx_models', 'pack', 'paths', 'pool',
   'project',
   'segments', '__segmentation.py',
-  'scribinator'
+  'scribinator', 'server', 'spans', 'stream', 'suite',
+  'transcriber',
+  'vad'
 ]
@@ -0,0 +1,79 @@
+import os, subprocess
+
+import numpy as np
+
+from ege.utils import atomic_write
+
+"""
+  The decoded audio of a project
+
+  The source is decoded exactly once, by ffmpeg, into a canonical 16 kHz mono
+  float32 .npy file. Every stage then memory-maps that file and works on
+  views of it, so nothing is decoded twice and no stage holds its own copy
+  of the recording. 16 kHz mono is what both pyannote and whisper want, so
+  the views go straight into the models.
+"""
+
+SAMPLE_RATE = 16000
+
+# enough room in the .npy header for any number of samples
+HEADER = 128
+
+
+def npy_header(samples: int) -> bytes:
+  """A fixed-size .npy (version 1.0) header for a 1-d float32 array"""
+  d = repr({'descr': '<f4', 'fortran_order': False, 'shape': (samples,)})
+  d = d.ljust(HEADER - 10 - 1) + '\n'
+  return b'\x93NUMPY\x01\x00' + len(d).to_bytes(2, 'little') + d.encode('latin1')
+
+
+def decode(source: str, path: str) -> None:
+  """
+    Decode any audio file ffmpeg can read into our canonical .npy
+
+    The samples stream straight from ffmpeg to disk, so this never holds the
+    recording in memory. The header is written last, once we know the length,
+    and the file only appears under its real name when it is complete.
+  """
+  with atomic_write(path) as f:
+    f.write(npy_header(0))
+    proc = subprocess.Popen(
+      ["ffmpeg", "-i", source, "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "-"],
+      stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    size = 0
+    for chunk in iter(lambda: proc.stdout.read(1 << 20), b''):
+      f.write(chunk)
+      size += len(chunk)
+    if proc.wait() != 0: raise RuntimeError(f"ffmpeg could not decode {source}")
+    f.seek(0)
+    f.write(npy_header(size // 4))
+
+
+class Audio:
+  """
+    Random access to the decoded samples of a project
+
+    Everything handed out is a view of the memory-mapped file - nothing is
+    copied, and only the pages actually touched are ever read from disk.
+  """
+
+  def __init__(self, path: str) -> None:
+    self.path = path
+    self.samples = np.load(path, mmap_mode='r')
+    self.sample_rate: int = SAMPLE_RATE
+    self.channels: int = 1
+    self.frames: int = len(self.samples)
+
+  @property
+  def duration(self) -> float:
+    """Length of the audio in seconds"""
+    return self.frames / self.sample_rate
+
+  def clip(self, start: float, end: float) -> np.ndarray:
+    """Get a view of the mono samples between start and end seconds"""
+    return self.samples[max(0, int(start * self.sample_rate)):max(0, int(end * self.sample_rate))]
+
+  def read(self, start: float, end: float) -> np.ndarray:
+    """Get a (channels, samples) view of the waveform between start and end seconds"""
+    return self.clip(start, end)[None, :]
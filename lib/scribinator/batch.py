@@ -0,0 +1,79 @@
+import argparse, os, time, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ege.logging import setup_logging
+from ege.utils import format_elapsed_time
+
+
+def limit_threads(threads: int) -> None:
+  """
+    Cap the threads torch and the math libraries use in this process
+
+    With several workers each running torch flat out, they would all try to use
+    every core and spend their time fighting each other instead. This has to
+    run before torch gets imported for the environment variables to count.
+  """
+  for k in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']:
+    os.environ[k] = str(threads)
+  import torch
+  torch.set_num_threads(threads)
+
+
+def worker_start(threads: int, verbosity: int) -> None:
+  """Set up a worker process in the pool"""
+  from .cli import set_verbosity
+  set_verbosity(verbosity)
+  limit_threads(threads)
+
+
+def worker_run(args: 'argparse.Namespace', path: str) -> float:
+  """Process a single file in a worker, returning the seconds of audio it had"""
+  from .scribinator import Scribinator
+  # the worker's steps go into the same trace as the rest of the run
+  if getattr(args, 'trace', None): setup_logging().tracing(args.trace)
+  s = Scribinator(args, path)
+  s.run()
+  return s.project.duration()
+
+
+class Batch:
+  """Process many files at once, spread across a pool of worker processes"""
+
+  def __init__(self, args: 'argparse.Namespace') -> None:
+    self.args = args
+    self.logger = setup_logging()
+    self.jobs = max(1, args.jobs)
+    self.threads = max(1, (os.cpu_count() or 1) // self.jobs)
+
+  def run(self, paths: list[str]) -> list[str]:
+    """Process all the paths, returning the ones that failed"""
+    # nobody wants hundreds of browser tabs
+    args = argparse.Namespace(**{**vars(self.args), 'open': False})
+    audio = 0.0
+    failed = []
+    start = time.time()
+
+    with self.logger.indent(f"Processing {len(paths):,} input files with {self.jobs} jobs of {self.threads} threads", True):
+      with ProcessPoolExecutor(
+        self.jobs,
+        initializer=worker_start,
+        initargs=(self.threads, self.args.verbosity)
+      ) as pool:
+        futures = {pool.submit(worker_run, args, path): path for path in paths}
+        with self.logger.progress("Files", len(paths)) as prog:
+          for future in as_completed(futures):
+            try:
+              audio += future.result()
+            except Exception:
+              self.logger.error(f"{futures[future]} failed\n{traceback.format_exc()}")
+              failed.append(futures[future])
+            prog.next()
+
+      # report how fast we chewed through it all
+      wall = time.time() - start
+      self.logger.info(f"Audio processed: {format_elapsed_time(audio)} in {format_elapsed_time(wall)}")
+      self.logger.info(f"Throughput: {audio / max(wall, 1e-9):.2f} audio-hours per wall-clock hour")
+      if len(failed) > 0:
+        self.logger.warning(f"{len(failed):,} files failed: {', '.join(failed)}")
+
+    return failed
@@ -0,0 +1,146 @@
+import argparse, re, time
+
+from ege.logging import setup_logging
+from ege.utils import format_elapsed_time
+
+"""
+  How fast, and how well, the different ways of doing a step compare
+
+  Each comparison runs the alternatives over the same project and reports
+  the wall time of each one, and how closely their outputs agree.
+"""
+
+ENGINES = ['segments', 'whole']
+PRECISIONS = ['fp32', 'int8']
+BACKENDS = ['torch', 'onnx']
+
+
+def words(text: str) -> list[str]:
+  """The words of a transcript, ignoring case and punctuation"""
+  return re.findall(r"[\w']+", text.lower())
+
+
+def word_errors(reference: list[str], hypothesis: list[str]) -> int:
+  """The word-level edit distance between two transcripts"""
+  row = list(range(len(hypothesis) + 1))
+  for i, r in enumerate(reference, 1):
+    previous, row[0] = row[0], i
+    for j, h in enumerate(hypothesis, 1):
+      previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (r != h))
+  return row[-1]
+
+
+def word_error_rate(references: list[str], hypotheses: list[str]) -> float:
+  """The word error rate of hypotheses against references, paired up text by text"""
+  errors = total = 0
+  for reference, hypothesis in zip(references, hypotheses):
+    reference, hypothesis = words(reference), words(hypothesis)
+    errors += word_errors(reference, hypothesis)
+    total += len(reference)
+  return errors / max(total, 1)
+
+
+class Benchmark:
+  def __init__(self, args: 'argparse.Namespace') -> None:
+    self.args = args
+    self.logger = setup_logging()
+
+  def engines(self, path: str) -> dict:
+    """
+      Transcribe a recording with every engine and compare them
+
+      Both engines get the same speaker turns and the same (already loaded)
+      model, so the wall times only count transcription. Agreement is one
+      minus the word error rate of each engine against the first, turn by
+      turn, so a word that lands in the wrong turn counts against it too.
+    """
+    from .scribinator import Scribinator
+
+    s = Scribinator(self.args, path).segments
+    s.detect()
+    transcriber = s.transcriber()
+    todo = list(range(len(s.segments)))
+
+    ret = {}
+    with self.logger.indent(f"Comparing transcription engines on {path}", True):
+      for engine in ENGINES:
+        start = time.time()
+        results = dict(getattr(s, 'transcribe_' + engine)(transcriber, todo))
+        ret[engine] = {
+          'seconds': time.time() - start,
+          'texts': [results[i]['text'] for i in todo],
+        }
+      self.report(ret, s.audio().duration)
+    return ret
+
+  def precisions(self, path: str) -> dict:
+    """
+      Transcribe a reference recording at every precision and compare them
+
+      The models are loaded (and quantized, the first time) before the clock
+      starts. The word error rate is against the full precision transcript,
+      so it is what quantizing costs, not how good whisper is.
+    """
+    from .models import Models
+    from .scribinator import Scribinator
+    from .transcriber import Transcriber
+
+    s = Scribinator(self.args, path).segments
+    s.detect()
+    todo = list(range(len(s.segments)))
+
+    ret = {}
+    with self.logger.indent(f"Comparing precisions on {path}", True):
+      for precision in PRECISIONS:
+        args = argparse.Namespace(**{**vars(self.args), 'precision': precision})
+        transcriber = Transcriber(Models(args).load('transcribe'), getattr(args, 'batch_size', 16))
+        start = time.time()
+        results = dict(s.transcribe_segments(transcriber, todo))
+        ret[precision] = {
+          'seconds': time.time() - start,
+          'texts': [results[i]['text'] for i in todo],
+        }
+      self.report(ret, s.audio().duration)
+    return ret
+
+  def backends(self, path: str) -> dict:
+    """
+      Diarize a recording with every backend and compare them
+
+      The cache is skipped, and the pipelines are loaded before the clock
+      starts, so the wall times only count diarization.
+    """
+    from .diarization import diarize
+    from .models import Models
+    from .scribinator import Scribinator
+
+    audio = Scribinator(self.args, path).segments.audio()
+    ret = {}
+    with self.logger.indent(f"Comparing diarization backends on {path}", True):
+      for backend in BACKENDS:
+        args = argparse.Namespace(**{**vars(self.args), 'backend': backend})
+        pipeline = Models(args).load('detect')
+        start = time.time()
+        turns = list(diarize(pipeline, audio, window=getattr(args, 'window', 0), overlap=getattr(args, 'overlap', 30)))
+        ret[backend] = {
+          'seconds': time.time() - start,
+          'turns': turns,
+        }
+      self.report(ret, audio.duration)
+      for backend in BACKENDS:
+        turns = ret[backend]['turns']
+        self.logger.info(f"{backend:<10} {len(turns):,} turns by {len(set(t[2] for t in turns))} speakers")
+    return ret
+
+  def report(self, runs: dict, duration: float) -> None:
+    """Add the real-time factor, speed-up and (for transcripts) agreement of each run against the first, and log them"""
+    first = next(iter(runs))
+    for name, r in runs.items():
+      r['rtf'] = r['seconds'] / max(duration, 1e-9)
+      r['speedup'] = runs[first]['seconds'] / max(r['seconds'], 1e-9)
+      message = f"{name:<10} {format_elapsed_time(r['seconds'])} (real-time factor {r['rtf']:.3f}, {r['speedup']:.2f}x)"
+      if 'texts' in r:
+        r['wer'] = word_error_rate(runs[first]['texts'], r['texts'])
+        r['agreement'] = 1 - r['wer']
+        message += f", agreement with {first} {r['agreement']:.1%}"
+      self.logger.info(message)
@@ -0,0 +1,102 @@
+import hashlib, json, os, shutil, time
+
+import numpy as np
+
+from ege.logging import setup_logging
+from ege.utils import atomic_write, format_elapsed_time
+
+
+def hash_audio(path: str) -> str:
+  """
+    Hash the decoded samples of a project (its all.npy)
+
+    Renaming, copying or re-wrapping a file in another container does not
+    change the hash - only a change to what it sounds like does.
+  """
+  h = hashlib.sha256()
+  samples = np.load(path, mmap_mode='r')
+  for i in range(0, len(samples), 1 << 20):
+    h.update(memoryview(samples[i:i + (1 << 20)]))
+  return h.hexdigest()
+
+
+class Cache:
+  """
+    A shared store of results, keyed by a hash of everything that produced them
+
+    Entries live in one directory per store (like 'detect') under the cache
+    root, shared by every project. Reading an entry marks it as recently used,
+    and the least recently used entries are evicted once the whole cache grows
+    past its size limit.
+  """
+
+  def __init__(self, args: 'argparse.Namespace', store: str) -> None:
+    self.args = args
+    self.logger = setup_logging()
+    self.root = (getattr(args, 'cache', None) or os.path.join(os.getcwd(), 'cache')).rstrip('/')
+    self.dir = os.path.join(self.root, store)
+    self.limit = int(getattr(args, 'cache_size', 1024) * 1024 * 1024)
+
+  @staticmethod
+  def key(*parts) -> str:
+    """Hash anything json can represent into a key"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+  def path(self, key: str) -> str:
+    return os.path.join(self.dir, key + '.json')
+
+  def get(self, key: str):
+    """Get a cached value, or None if we have not seen this key"""
+    path = self.path(key)
+    if not os.path.exists(path): return None
+    os.utime(path)
+    with open(path, 'r') as f: return json.load(f)
+
+  def put(self, key: str, value) -> None:
+    """Save a value, then evict old entries if the cache is too big"""
+    os.makedirs(self.dir, exist_ok=True)
+    with atomic_write(self.path(key), 'w') as f: json.dump(value, f)
+    self.prune()
+
+  def entries(self) -> list[tuple[str, int, float]]:
+    """All (path, bytes, last used) entries in every store, least recently used first"""
+    ret = []
+    if not os.path.exists(self.root): return ret
+    for d, _, files in os.walk(self.root):
+      for name in files:
+        if not name.endswith('.json'): continue
+        st = os.stat(os.path.join(d, name))
+        ret.append((os.path.join(d, name), st.st_size, st.st_mtime))
+    return sorted(ret, key=lambda e: e[2])
+
+  def size(self) -> int:
+    return sum(e[1] for e in self.entries())
+
+  def prune(self, limit: int = None) -> int:
+    """Evict the least recently used entries until the cache fits in limit bytes, returning how many went"""
+    limit = self.limit if limit is None else limit
+    entries = self.entries()
+    total = sum(e[1] for e in entries)
+    removed = 0
+    for path, size, _ in entries:
+      if total <= limit: break
+      os.unlink(path)
+      total -= size
+      removed += 1
+    return removed
+
+  def clear(self) -> None:
+    """Remove everything in the cache"""
+    if os.path.exists(self.root): shutil.rmtree(self.root)
+
+  def report(self) -> None:
+    """Log what is in the cache"""
+    entries = self.entries()
+    with self.logger.indent(f"Cache in {self.root}"):
+      stores = sorted(set(os.path.basename(os.path.dirname(e[0])) for e in entries))
+      for store in stores:
+        mine = [e for e in entries if os.path.basename(os.path.dirname(e[0])) == store]
+        self.logger.info(f"{store + ':':<12s} {len(mine):,} entries, {sum(e[1] for e in mine) / 1024 / 1024:.1f} MB")
+      self.logger.info(f"{'total:':<12s} {len(entries):,} entries, {self.size() / 1024 / 1024:.1f} of {self.limit / 1024 / 1024:.0f} MB")
+      if len(entries) > 0:
+        self.logger.info(f"{'oldest:':<12s} last used {format_elapsed_time(time.time() - entries[0][2])} ago")
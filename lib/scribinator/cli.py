@@ -21,6 +21,9 @@ def cli_start(parser):
   """Call this at the start of your arg parsing"""
   # force recalculation from the ground up
   parser.add_argument('-r', '--reset', action='store_true', default=False, help="Recompute all files from scratch")
+  # or just one step, keeping everything else
+  parser.add_argument('--reset-stage', action='append', choices=['detect', 'extract', 'transcribe', 'emotions'], default=[],
+                      help="Recompute one step (can be given more than once)")
 
   # Define verbosity levels
   parser.add_argument('-q', '--quiet', action='store_const', const=0, help="Run in quiet mode (verbosity level 0).")
@@ -30,11 +33,98 @@ def cli_start(parser):
   # where the models folder is kept
   parser.add_argument('--models', type=str, default=None, help="Where the model files are kept")
 
+  # the shared cache of results, reused across projects
+  parser.add_argument('--cache', type=str, default=None, help="Where the shared result cache is kept")
+  parser.add_argument('--cache-size', type=float, default=1024, help="Most megabytes the shared cache may use")
 
-def cli_end(parser):
+  # the voices of people we know, shared by every project
+  parser.add_argument('--library', type=str, default=None, help="Where the library of known speakers is kept")
+
+  # a timeline of the run, worker processes included
+  parser.add_argument('--trace', type=str, default=None, metavar='OUT.json',
+                      help="Write a trace of every step to this file, to open in Perfetto or chrome://tracing")
+
+  # where bin/server listens for jobs
+  parser.add_argument('--socket', type=str, default=os.path.join(os.getcwd(), 'scribinator.sock'),
+                      help="Socket the model server listens on")
+
+
+def cli_processing(parser):
+  """The switches that say how files are processed, shared by everything that runs the pipeline"""
+  # long recordings are diarized in overlapping windows so memory stays flat
+  parser.add_argument('--window', type=float, default=1800,
+                      help="Diarize in windows of this many seconds (0 for the whole file at once)")
+  parser.add_argument('--overlap', type=float, default=30, help="Seconds of overlap between diarization windows")
+
+  # find the speech first so the slow stages skip the silence
+  parser.add_argument('--vad', action='store_true', default=False,
+                      help="Skip silence before finding speakers and transcribing")
+
+  # whisper works through this many segments at a time
+  parser.add_argument('--batch-size', type=int, default=16,
+                      help="Number of segments to transcribe at once")
+
+  # the emotion model scores this many segments at a time, of about the same length
+  parser.add_argument('--emotion-batch-size', type=int, default=None,
+                      help="Number of segments to score for emotions at once (16 for audio, 256 for text)")
+
+  # reading the transcripts is much cheaper than listening, and good enough for triage
+  parser.add_argument('--emotion-source', choices=['audio', 'text'], default='audio',
+                      help="Find the emotions in the voice, or in the transcript")
+
+  # most turns are a few seconds, so whisper's 30 second window is mostly padding
+  parser.add_argument('--combine', action='store_true', default=False,
+                      help="Transcribe runs of short segments together in one 30 second window")
+
+  # whisper can hear each segment on its own, or the whole recording at once
+  parser.add_argument('--engine', choices=['segments', 'whole'], default='segments',
+                      help="Transcribe each segment separately, or the whole file at once split up by speaker")
+
+  # on a machine without a GPU, whisper can run in several processes at once
+  parser.add_argument('--workers', type=int, default=1,
+                      help="Number of processes to transcribe the segments with")
+
+  # pyannote's networks can run in onnxruntime once ./bin/models --onnx has exported them
+  parser.add_argument('--backend', choices=['torch', 'onnx'], default='torch',
+                      help="Run the diarization networks in torch, or in onnxruntime where they have been exported")
+
+  # int8 runs the models several times faster on a cpu, for a little accuracy
+  parser.add_argument('--precision', choices=['fp32', 'int8'], default='fp32',
+                      help="Run the transcription and emotion models at full precision, or quantized to int8")
+
+  # every segment goes on to the next step as soon as it is found
+  parser.add_argument('--stream', action='store_true', default=False,
+                      help="Run all the steps at once, passing each segment along as soon as it is ready")
+
+  # keep the segment clips and transcripts in one indexed file instead of thousands
+  parser.add_argument('--pack', action='store_true', default=False,
+                      help="Keep the segment files in a single segments.pack")
+
+  # show the results when done
+  parser.add_argument('--no-open', dest='open', action='store_false', default=True,
+                      help="Do not open the results in a web browser")
+
+
+def set_verbosity(verbosity: int) -> logging.Logger:
+  """Set the level of our logger from the verbosity switches"""
+  logger = setup_logging()
+  if verbosity == 0:
+    logger.setLevel(logging.CRITICAL)
+  elif verbosity == 1:
+    logger.setLevel(logging.WARNING)
+  elif verbosity == 2:
+    logger.setLevel(logging.INFO)
+  elif verbosity == 3:
+    logger.setLevel(logging.DEBUG)
+  else:
+    logger.setLevel(logging.INFO)
+  return logger
+
+
+def cli_end(parser, argv=None):
   """Call this at the end of your arg parsing"""
   # get the args as a namespace and clean up the verbosity/quiet switches
-  args = parser.parse_args()
+  args = parser.parse_args(argv)
   if args.quiet is not None:
       args.verbosity = args.quiet
   else:
@@ -43,17 +133,8 @@ def cli_end(parser):
   del args.verbose
 
   # Setup custom logger and set the verbosity
-  logger = setup_logging()
-  if args.verbosity == 0:
-    logger.setLevel(logging.CRITICAL)
-  elif args.verbosity == 1:
-    logger.setLevel(logging.WARNING)
-  elif args.verbosity == 2:
-    logger.setLevel(logging.INFO)
-  elif args.verbosity == 3:
-    logger.setLevel(logging.DEBUG)
-  else:
-    logger.setLevel(logging.INFO)
+  logger = set_verbosity(args.verbosity)
+  if args.trace: logger.tracing(args.trace, fresh=True)
 
   # show our parameters
   with logger.indent("Settings"):
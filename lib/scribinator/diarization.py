@@ -0,0 +1,275 @@
+import os, warnings
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from ege.logging import setup_logging
+from ege.utils import atomic_write
+
+
+def plan_windows(duration: float, window: float, overlap: float) -> List[Tuple[float, float, float, float]]:
+  """
+    Split the timeline into overlapping windows for diarization
+
+    Returns (start, end, core_start, core_end) tuples. Each window is diarized
+    over [start, end), but only the turns inside its core are kept. The cores
+    tile the whole timeline with no gaps, so every moment is owned by exactly
+    one window, and the overlap gives pyannote some context on either side.
+  """
+  if window <= 0 or duration <= window:
+    return [(0.0, duration, 0.0, duration)]
+  if overlap < 0 or overlap >= window:
+    raise ValueError(f'overlap must be at least 0 and less than the window ({window}s)')
+
+  ret = []
+  step = window - overlap
+  start = 0.0
+  while True:
+    end = min(start + window, duration)
+    core_start = 0.0 if start == 0 else start + overlap / 2
+    core_end = duration if end >= duration else end - overlap / 2
+    ret.append((start, end, core_start, core_end))
+    if end >= duration: break
+    start += step
+  return ret
+
+
+class Stitcher:
+  """
+    Give speakers found in separate windows consistent labels
+
+    Every window labels its own speakers from zero. The stitcher keeps a
+    centroid embedding for each speaker seen so far and matches the speakers of
+    each new window to them by cosine similarity. Anyone who does not match
+    well enough is a new speaker.
+  """
+
+  def __init__(self, threshold: float = 0.6) -> None:
+    self.threshold = threshold
+    self.centroids = []
+    self.weights = []
+
+  @staticmethod
+  def normalize(v: np.ndarray) -> np.ndarray:
+    n = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.where(n > 0, n, 1)
+
+  def assign(self, embeddings: np.ndarray, durations: List[float]) -> List[int]:
+    """
+      Map the local speakers of one window onto global speaker numbers
+
+      embeddings: (local speakers, dimension) array, one row per local speaker
+      durations: seconds of speech for each local speaker, used as the weight
+      when folding the local embedding into the global centroid
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    valid = ~np.isnan(embeddings).any(axis=1) if len(embeddings) else np.zeros(0, dtype=bool)
+    ret = [None] * len(embeddings)
+
+    # greedily pair the most similar local and global speakers first
+    if len(self.centroids) > 0 and valid.any():
+      similarity = self.normalize(np.nan_to_num(embeddings)) @ self.normalize(np.array(self.centroids)).T
+      taken = set()
+      for flat in np.argsort(-similarity, axis=None):
+        local, known = np.unravel_index(flat, similarity.shape)
+        if similarity[local, known] < self.threshold: break
+        if not valid[local] or ret[local] is not None or known in taken: continue
+        ret[local] = int(known)
+        taken.add(known)
+
+    # everyone else is new
+    for local in range(len(embeddings)):
+      if ret[local] is not None: continue
+      ret[local] = len(self.centroids)
+      self.centroids.append(np.zeros(embeddings.shape[1]))
+      self.weights.append(0.0)
+
+    # fold the new evidence into the centroids, weighted by how much they spoke
+    for local, known in enumerate(ret):
+      if not valid[local]: continue
+      w = max(durations[local], 1e-3)
+      unit = self.normalize(embeddings[local])
+      self.centroids[known] = (self.centroids[known] * self.weights[known] + unit * w) / (self.weights[known] + w)
+      self.weights[known] += w
+
+    return ret
+
+  def voices(self) -> List[np.ndarray]:
+    """The centroid of each global speaker, or NaN for those who never had a usable embedding"""
+    return [np.array(c) if w > 0 else np.full(len(c), np.nan) for c, w in zip(self.centroids, self.weights)]
+
+
+class Capture:
+  """
+    Keep what pyannote works out before it clusters, window by window
+
+    The segmentation scores, the count of speakers in each frame and the
+    embedding of each local speaker are all that the clustering step needs,
+    so with them saved the speakers can be clustered again (into a set
+    number of speakers, say) without running the neural networks again.
+  """
+
+  def __init__(self) -> None:
+    self.windows = []
+    self.arrays = {}
+    self.voices = []
+
+  def hook(self, k: int):
+    """A pyannote hook that keeps the steps of window k"""
+    def hook(step: str, artifact, file=None, total=None, completed=None) -> None:
+      # steps that take a while also report their progress along the way
+      if completed is not None: return
+      if step in ['segmentation', 'speaker_counting']:
+        w = artifact.sliding_window
+        self.arrays[f'{k}_{step}'] = artifact.data
+        self.arrays[f'{k}_{step}_window'] = np.array([w.start, w.duration, w.step])
+      elif step == 'embeddings':
+        self.arrays[f'{k}_embeddings'] = artifact
+    return hook
+
+  def save(self, path: str) -> None:
+    """Save everything in one compressed numpy file"""
+    with atomic_write(path) as f:
+      np.savez_compressed(f, windows=np.array(self.windows, dtype=np.float64).reshape(-1, 4), **self.arrays)
+
+
+def cluster(pipeline, saved, k: int, num_speakers: int = None, min_speakers: int = None, max_speakers: int = None):
+  """
+    The clustering step of pyannote's SpeakerDiarization.apply(), on what was saved for window k
+
+    Returns the (diarization, centroids) pyannote would have, with no neural
+    network in sight.
+  """
+  from pyannote.core import SlidingWindow, SlidingWindowFeature
+
+  def feature(step: str) -> 'SlidingWindowFeature':
+    start, duration, step_ = saved[f'{k}_{step}_window']
+    return SlidingWindowFeature(saved[f'{k}_{step}'], SlidingWindow(start=start, duration=duration, step=step_))
+
+  segmentations = feature('segmentation')
+  count = feature('speaker_counting')
+  num_speakers, min_speakers, max_speakers = pipeline.set_num_speakers(
+    num_speakers=num_speakers, min_speakers=min_speakers, max_speakers=max_speakers
+  )
+
+  # nobody ever spoke
+  from pyannote.core import Annotation
+  if f'{k}_embeddings' not in saved or np.nanmax(count.data) == 0:
+    return Annotation(), np.zeros((0, 1))
+
+  # 3.1 segments in powerset mode, where the scores are already binary
+  binarized = segmentations
+  if not pipeline._segmentation.model.specifications.powerset:
+    from pyannote.audio.utils.signal import binarize
+    binarized = binarize(segmentations, onset=pipeline.segmentation.threshold, initial_state=False)
+
+  hard_clusters, _, centroids = pipeline.clustering(
+    embeddings=saved[f'{k}_embeddings'],
+    segmentations=binarized,
+    num_clusters=num_speakers,
+    min_clusters=min_speakers,
+    max_clusters=max_speakers,
+    frames=pipeline._frames,
+  )
+  count.data = np.minimum(count.data, max_speakers).astype(np.int8)
+  hard_clusters[np.sum(binarized.data, axis=1) == 0] = -2
+  discrete = pipeline.reconstruct(segmentations, hard_clusters, count)
+  diarization = pipeline.to_annotation(discrete, min_duration_on=0.0, min_duration_off=pipeline.segmentation.min_duration_off)
+
+  # the labels are the centroid rows; name them the way the pipeline does
+  labels = diarization.labels()
+  diarization = diarization.rename_labels(mapping=dict(zip(labels, pipeline.classes())))
+  if len(labels) > centroids.shape[0]:
+    centroids = np.pad(centroids, ((0, len(labels) - centroids.shape[0]), (0, 0)))
+  return diarization, centroids[labels]
+
+
+def stitch(windows: List[Tuple[float, float, float, float]], run, voices: list = None) -> Iterator[Tuple[float, float, int]]:
+  """
+    Yield the (start, end, speaker) turns of each window in time order, on global speakers
+
+    run(k, start, end) gives the (diarization, embeddings) of window k. Once
+    all the turns are out, voices (if given) holds an embedding for each
+    global speaker, NaN for any without one.
+  """
+  logger = setup_logging()
+
+  # one shot - the labels are already consistent
+  if len(windows) == 1:
+    diarization, embeddings = run(0, windows[0][0], windows[0][1])
+    for turn, _, speaker in diarization.itertracks(yield_label=True):
+      yield turn.start, turn.end, int(speaker.split('_')[1])
+    if voices is not None and embeddings is not None and len(embeddings) > 0:
+      numbers = [int(label.split('_')[1]) for label in diarization.labels()]
+      voices[:] = [np.full(embeddings.shape[1], np.nan) for _ in range(max(numbers, default=-1) + 1)]
+      for number, embedding in zip(numbers, embeddings): voices[number] = np.asarray(embedding)
+    return
+
+  stitcher = Stitcher()
+  with logger.progress("Diarizing windows", len(windows)) as prog:
+    for k, (start, end, core_start, core_end) in enumerate(windows):
+      diarization, embeddings = run(k, start, end)
+      labels = diarization.labels()
+      speakers = dict(zip(labels, stitcher.assign(
+        embeddings[:len(labels)],
+        [diarization.label_duration(label) for label in labels]
+      )))
+
+      # shift back onto the full timeline and keep only what this window owns
+      for turn, _, speaker in diarization.itertracks(yield_label=True):
+        s = max(turn.start + start, core_start)
+        e = min(turn.end + start, core_end)
+        if e > s: yield s, e, speakers[speaker]
+      prog.next()
+  if voices is not None: voices[:] = stitcher.voices()
+
+
+def diarize(pipeline, audio, window: float = 0, overlap: float = 30, capture: Capture = None) -> Iterator[Tuple[float, float, int]]:
+  """
+    Run a pyannote pipeline over the audio, yielding (start, end, speaker) turns in time order
+
+    With a window of 0, or audio shorter than the window, the whole file goes
+    through the pipeline in one call. Otherwise only one window of samples is
+    ever held in memory, and the speakers of each window are stitched onto
+    global speakers using the embeddings pyannote computes for them.
+    Turns are yielded as soon as their window is finished.
+
+    With a capture, what the pipeline works out before clustering is kept, so
+    recluster() can do the clustering again later.
+  """
+  import torch
+
+  # the samples are read-only views of the project audio, which pyannote never writes to
+  warnings.filterwarnings(action='ignore', message='The given NumPy array is not writable')
+
+  def run(k: int, start: float, end: float):
+    file = {"waveform": torch.from_numpy(audio.read(start, end)), "sample_rate": audio.sample_rate}
+    return pipeline(file, return_embeddings=True, hook=capture.hook(k) if capture is not None else None)
+
+  windows = plan_windows(audio.duration, window, overlap)
+  if capture is not None: capture.windows = windows
+  yield from stitch(windows, run, capture.voices if capture is not None else None)
+
+
+def recluster(pipeline, path: str, threshold: float = None, voices: list = None, **speakers) -> Iterator[Tuple[float, float, int]]:
+  """
+    diarize() again from what a Capture saved in path, with new speaker counts (num_, min_ and max_speakers)
+
+    Only the clustering runs, so this takes moments rather than the minutes
+    the neural networks would. A threshold changes how alike two speakers
+    have to sound to be taken for one - lower merges more of them.
+  """
+  saved = np.load(path)
+  windows = [tuple(w) for w in saved['windows'].tolist()]
+
+  def run(k: int, start: float, end: float):
+    return cluster(pipeline, saved, k, **speakers)
+
+  # the pipeline may be shared (bin/server), so put its threshold back afterwards
+  params = pipeline.parameters(instantiated=True)
+  if threshold is not None:
+    pipeline.instantiate({**params, 'clustering': {**params['clustering'], 'threshold': threshold}})
+  try:
+    yield from stitch(windows, run, voices)
+  finally:
+    if threshold is not None: pipeline.instantiate(params)
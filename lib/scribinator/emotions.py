@@ -0,0 +1,143 @@
+import numpy as np
+
+from .pool import longest_first
+
+"""
+  The emotions of each segment
+
+  An audio classifier (wav2vec2 fine-tuned for speech emotion) scores the
+  clips straight out of the decoded recording. The clips are sorted by
+  length and batched, so each batch is padded out to about the same length
+  and hardly any of the work is spent on padding.
+
+  With --emotion-source text, a text classifier reads the transcripts
+  instead. That is good enough for triage and a great deal cheaper, so it
+  runs on the cpu, hundreds of segments at a time.
+
+  The model's own labels (angry, happy, neutral, ...) are folded into the
+  seven Ekman emotions, in the order the results page shows them. Labels
+  that are not one of them (neutral, calm) count towards none, so a flat
+  delivery scores low all round.
+"""
+
+SAMPLE_RATE = 16000
+
+# in the order the results page shows them
+EKMAN = ['fear', 'contempt', 'disgust', 'sadness', 'anger', 'happiness', 'surprise']
+
+# what emotion models call them
+LABELS = {
+  'fear': 'fear', 'fearful': 'fear', 'fea': 'fear',
+  'contempt': 'contempt',
+  'disgust': 'disgust', 'disgusted': 'disgust', 'dis': 'disgust',
+  'sadness': 'sadness', 'sad': 'sadness',
+  'anger': 'anger', 'angry': 'anger', 'ang': 'anger',
+  'happiness': 'happiness', 'happy': 'happiness', 'hap': 'happiness', 'joy': 'happiness',
+  'surprise': 'surprise', 'surprised': 'surprise', 'sur': 'surprise',
+}
+
+MAX_SECONDS = 20          # how much of a segment is heard - the tone is clear well before then
+MIN_SECONDS = 0.1         # shorter clips are padded out, the convolutions need at least this much
+MAX_TOKENS = 512          # how much of a transcript is read
+
+
+def columns(id2label: dict) -> list[int]:
+  """The EKMAN column of each of a model's outputs, or None for labels that are not one of them"""
+  return [
+    EKMAN.index(LABELS[label.lower()]) if label.lower() in LABELS else None
+    for _, label in sorted((int(k), v) for k, v in id2label.items())
+  ]
+
+
+def ekman(probabilities: np.ndarray, columns: list[int]) -> list[int]:
+  """The seven Ekman scores (0 to 100) from the probabilities of a model's labels"""
+  ret = [0.0] * len(EKMAN)
+  for p, column in zip(probabilities, columns):
+    if column is not None: ret[column] += float(p)
+  return [int(round(100 * p)) for p in ret]
+
+
+def clip(samples: np.ndarray) -> np.ndarray:
+  """The part of a segment the model hears, padded out if it is very short"""
+  samples = np.asarray(samples[:int(MAX_SECONDS * SAMPLE_RATE)], dtype=np.float32)
+  short = int(MIN_SECONDS * SAMPLE_RATE) - len(samples)
+  return np.pad(samples, (0, short)) if short > 0 else samples
+
+
+class Scorer:
+  """An emotion model, run over many segments at once - what it hears of each is up to the subclasses"""
+
+  def __init__(self, model, processor, batch_size: int = 16) -> None:
+    self.model = model
+    self.processor = processor
+    self.batch_size = max(1, batch_size)
+    self.columns = columns(model.config.id2label)
+
+  def device(self) -> 'torch.device':
+    """Wherever the model was loaded - int8 models are on the cpu"""
+    import torch
+    try:
+      return next(self.model.parameters()).device
+    except StopIteration:
+      return torch.device('cpu')
+
+  def prepare(self, item):
+    """What the model gets of one segment"""
+    return item
+
+  def score(self, items: list) -> list[list[int]]:
+    """The seven Ekman scores of each segment, batched by length"""
+    items = [self.prepare(item) for item in items]
+    ret = [None] * len(items)
+    for batch in longest_first([len(item) for item in items], self.batch_size):
+      for k, scores in zip(batch, self.forward([items[k] for k in batch])):
+        ret[k] = scores
+    return ret
+
+  def forward(self, batch: list) -> list[list[int]]:
+    raise NotImplementedError
+
+  def run(self, inputs: dict) -> list[list[int]]:
+    """The Ekman scores from a single pass of the model over a batch of inputs"""
+    import torch
+    device = self.device()
+    inputs = {k: v.to(device) for k, v in inputs.items()}
+    with torch.inference_mode():
+      probabilities = self.model(**inputs).logits.float().softmax(dim=-1).cpu().numpy()
+    return [ekman(p, self.columns) for p in probabilities]
+
+
+class AudioScorer(Scorer):
+  """Hears the emotion in the voice of each clip"""
+
+  def prepare(self, samples: np.ndarray) -> np.ndarray:
+    return clip(samples)
+
+  def forward(self, batch: list[np.ndarray]) -> list[list[int]]:
+    return self.run(self.processor(batch, sampling_rate=SAMPLE_RATE, padding=True, return_attention_mask=True, return_tensors='pt'))
+
+
+class TextScorer(Scorer):
+  """
+    Reads the emotion in what was said
+
+    Text is far cheaper than audio, so the batches are big, padded only as
+    far as the longest transcript in each. Segments with nothing said score
+    nothing at all.
+  """
+
+  def prepare(self, text: str) -> str:
+    return (text or '').strip()
+
+  def forward(self, batch: list[str]) -> list[list[int]]:
+    said = [k for k, text in enumerate(batch) if text]
+    ret = [[0] * len(EKMAN) for _ in batch]
+    if len(said) > 0:
+      inputs = self.processor([batch[k] for k in said], padding=True, truncation=True, max_length=MAX_TOKENS, return_tensors='pt')
+      for k, scores in zip(said, self.run(inputs)): ret[k] = scores
+    return ret
+
+
+# how many segments each kind of scorer takes at once, unless --emotion-batch-size says otherwise
+BATCH_SIZE = {'audio': 16, 'text': 256}
+SCORERS = {'audio': AudioScorer, 'text': TextScorer}
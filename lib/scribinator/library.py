@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+
+from ege.logging import setup_logging
+from ege.utils import atomic_write
+
+"""
+  The people we know by voice
+
+  The same few people turn up in recording after recording, but every
+  project numbers its speakers from scratch. The library keeps a voice print
+  (a centroid of speaker embeddings) for each person who has been named, and
+  the speakers of a new recording are matched against all of them at once
+  with one matrix product of cosine similarities.
+
+  Past a few thousand people that product gets slow, so then faiss (when it
+  is installed) answers from an approximate nearest-neighbour index instead.
+"""
+
+THRESHOLD = 0.6           # cosine similarity a speaker needs to be taken for a known person
+APPROXIMATE = 5000        # people in the library before an approximate index is worth building
+
+
+def normalize(v: np.ndarray) -> np.ndarray:
+  n = np.linalg.norm(v, axis=-1, keepdims=True)
+  return v / np.where(n > 0, n, 1)
+
+
+class Library:
+  """Voice prints of named people, kept in one numpy file"""
+
+  def __init__(self, args: 'argparse.Namespace') -> None:
+    self.args = args
+    self.logger = setup_logging()
+    self.dir = (getattr(args, 'library', None) or os.path.join(os.getcwd(), 'library')).rstrip('/')
+    self.path = os.path.join(self.dir, 'speakers.npz')
+    self.names: list[str] = []
+    self.centroids = np.zeros((0, 0), dtype=np.float32)
+    self.weights = np.zeros(0)
+    self._index = None
+    if os.path.exists(self.path):
+      with np.load(self.path) as saved:
+        self.names = saved['names'].tolist()
+        self.centroids = saved['centroids']
+        self.weights = saved['weights']
+
+  def __len__(self) -> int:
+    return len(self.names)
+
+  def save(self) -> None:
+    os.makedirs(self.dir, exist_ok=True)
+    with atomic_write(self.path) as f:
+      np.savez(f, names=np.array(self.names, dtype=str), centroids=self.centroids, weights=self.weights)
+
+  def add(self, name: str, embedding: np.ndarray, weight: float = 1.0) -> None:
+    """Fold a voice print into what we know of name, weighted by how much of them it is from"""
+    unit = normalize(np.asarray(embedding, dtype=np.float32))
+    if len(self) == 0: self.centroids = np.zeros((0, len(unit)), dtype=np.float32)
+    if len(unit) != self.centroids.shape[1]:
+      raise ValueError(f"voice prints of {len(unit)} numbers do not fit a library of {self.centroids.shape[1]}")
+    if name in self.names:
+      k = self.names.index(name)
+      w = self.weights[k]
+      self.centroids[k] = normalize((self.centroids[k] * w + unit * weight) / (w + weight))
+      self.weights[k] += weight
+    else:
+      self.names.append(name)
+      self.centroids = np.vstack([self.centroids, unit[None, :]])
+      self.weights = np.append(self.weights, weight)
+    self._index = None
+
+  def remove(self, name: str) -> None:
+    k = self.names.index(name)
+    del self.names[k]
+    self.centroids = np.delete(self.centroids, k, axis=0)
+    self.weights = np.delete(self.weights, k)
+    self._index = None
+
+  def similarity(self, embeddings: np.ndarray) -> np.ndarray:
+    """The (speakers, people) cosine similarities - only the nearest few per speaker once the library is big"""
+    embeddings = normalize(np.nan_to_num(np.asarray(embeddings, dtype=np.float32)))
+    if len(self) < APPROXIMATE: return embeddings @ self.centroids.T
+    index = self.index()
+    if index is None: return embeddings @ self.centroids.T
+
+    ret = np.full((len(embeddings), len(self)), -np.inf, dtype=np.float32)
+    scores, people = index.search(np.ascontiguousarray(embeddings), min(10, len(self)))
+    for i in range(len(embeddings)):
+      keep = people[i] >= 0
+      ret[i, people[i][keep]] = scores[i][keep]
+    return ret
+
+  def index(self):
+    """An approximate inner-product index of the centroids, or None without faiss"""
+    if self._index is None:
+      try:
+        import faiss
+      except ImportError:
+        return None
+      self._index = faiss.IndexHNSWFlat(self.centroids.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+      self._index.add(np.ascontiguousarray(self.centroids, dtype=np.float32))
+    return self._index
+
+  def match(self, embeddings: np.ndarray, threshold: float = THRESHOLD) -> list[str]:
+    """
+      The name of the person each speaker (a row of embeddings) is, or None for a stranger
+
+      No two speakers of a recording are taken for the same person - the most
+      alike pairs are matched first. Speakers without an embedding (NaN) are
+      strangers.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    ret = [None] * len(embeddings)
+    if len(self) == 0 or len(embeddings) == 0 or embeddings.shape[1] != self.centroids.shape[1]: return ret
+
+    valid = ~np.isnan(embeddings).any(axis=1)
+    similarity = self.similarity(embeddings)
+    taken = set()
+    for flat in np.argsort(-similarity, axis=None):
+      speaker, person = np.unravel_index(flat, similarity.shape)
+      if similarity[speaker, person] < threshold: break
+      if not valid[speaker] or ret[speaker] is not None or person in taken: continue
+      ret[speaker] = self.names[person]
+      taken.add(person)
+    return ret
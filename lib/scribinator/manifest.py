@@ -0,0 +1,49 @@
+import json, os, threading
+
+from ege.utils import atomic_write
+
+"""
+  What produced each result in a project
+
+  The manifest maps the project-relative path of every result (all.json,
+  segments/3.wav, segments/3_transcript.json, ...) to what went into making
+  it: the hash of the audio, the model and the settings, next to a
+  fingerprint hashing them all. A result is only reused when it is there and
+  its fingerprint still matches, so changing one thing (say the whisper
+  model) recomputes just what depends on it, and nothing stale is left
+  behind - while anyone reading the manifest can see what made each result.
+"""
+
+
+class Manifest:
+  def __init__(self, path: str) -> None:
+    self.path = path
+    self.lock = threading.Lock()
+    self._entries = None
+
+  def entries(self) -> dict[str, dict]:
+    """{result: {'hash': fingerprint, what made it...}} for everything the project has made"""
+    if self._entries is None:
+      self._entries = {}
+      if os.path.exists(self.path):
+        with open(self.path, 'r') as f: self._entries = json.load(f)
+    return self._entries
+
+  def get(self, name: str) -> str:
+    """The fingerprint of what made a result, or None if we do not know"""
+    entry = self.entries().get(name)
+    # older manifests, and notes like the audio hash, keep just the fingerprint
+    return entry['hash'] if isinstance(entry, dict) else entry
+
+  def made_with(self, name: str) -> dict:
+    """What made a result - the audio, model and settings - or None if we do not know"""
+    entry = self.entries().get(name)
+    return {k: v for k, v in entry.items() if k != 'hash'} if isinstance(entry, dict) else None
+
+  def set(self, name: str, fingerprint: str, made_with: dict = None) -> None:
+    with self.lock: self.entries()[name] = {'hash': fingerprint, **made_with} if made_with is not None else fingerprint
+
+  def save(self) -> None:
+    """Write the manifest out, so readers never see half of one"""
+    with self.lock:
+      with atomic_write(self.path, 'w') as f: json.dump(self.entries(), f, indent=1, sort_keys=True)
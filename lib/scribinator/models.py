@@ -1,10 +1,30 @@
-import os, os.path
+import functools, os, os.path
 
-from ege.utils import pp
+from ege.utils import atomic_write, pp
 from ege.logging import setup_logging
 
 class Models:
   """Class to handle the various ML models we use for this project"""
+
+  # where each of our models comes from, and the library that runs it
+  sources: dict = {
+    'detect': ('pyannote/speaker-diarization-3.1', 'pyannote.audio'),
+    'transcribe': ('base', 'openai-whisper'),
+    'emotions': ('ehcalabres/wav2vec2-lg-xlsr-en-speech-emotion-recognition', 'transformers'),
+  }
+
+  # --emotion-source text reads the transcripts instead of listening to the audio
+  text_sources: dict = {
+    'emotions': ('j-hartmann/emotion-english-distilroberta-base', 'transformers'),
+  }
+
+  # models that --precision int8 quantizes (the linear layers do nearly all the work)
+  quantizable: list = ['transcribe', 'emotions']
+
+  # models already loaded into memory, shared by every instance in this process
+  # so a long-running process (like bin/server) only pays for loading them once
+  loaded: dict = {}
+
   def __init__(self, args: 'argparse.Namespace') -> None:
     """Set up the models - dir is where to store the models, defaulting to the current working directory"""
     self.args = args
@@ -13,6 +33,9 @@ class Models:
 
     self.dir = self.args.models or os.path.join(os.getcwd(), 'models')
     self.dir = self.dir.rstrip('/')
+    self.precision = getattr(self.args, 'precision', 'fp32')
+    self.backend = getattr(self.args, 'backend', 'torch')
+    self.emotion_source = getattr(self.args, 'emotion_source', 'audio')
     self.logger = setup_logging()
 
   @staticmethod
@@ -68,6 +91,61 @@ class Models:
     path: str = self.path(name) + ".done"
     return os.path.exists(path)
 
+  def fingerprint(self, name: str) -> dict:
+    """Identify exactly which model (and library version) produces a result, without loading anything"""
+    model, library = self.source(name)
+    ret = {'model': model, 'library': library, 'version': library_version(library)}
+    if name in self.quantizable and self.precision != 'fp32': ret['precision'] = self.precision
+    if name == 'detect' and self.backend != 'torch': ret['backend'] = self.backend
+    return ret
+
+  def source(self, name: str) -> tuple[str, str]:
+    """The (model, library) a model comes from, as asked for on the command line"""
+    if name == 'emotions' and self.emotion_source == 'text': return self.text_sources[name]
+    return self.sources[name]
+
+  def variant(self, name: str) -> str:
+    """How a model is run, as asked for on the command line - the same model run two ways is loaded twice"""
+    if name == 'emotions': return f"{self.emotion_source}-{self.precision}"
+    if name in self.quantizable: return self.precision
+    if name == 'detect': return self.backend
+    return 'fp32'
+
+  def load(self, name: str):
+    """Get a model ready to run, loading it only the first time it is asked for in this process"""
+    key = (name, self.path(name), self.variant(name))
+    if key not in Models.loaded:
+      with self.logger.timer(f"Loaded model for {name}"):
+        if name in self.quantizable and self.precision == 'int8':
+          Models.loaded[key] = self.load_int8(name)
+        else:
+          Models.loaded[key] = getattr(self, 'load_' + name)()
+    return Models.loaded[key]
+
+  def quantized_path(self, name: str) -> str:
+    """Where the int8 copy of a model is kept"""
+    return os.path.join(self.path(name), f"{self.source(name)[0] or name}.int8.pt")
+
+  def load_int8(self, name: str):
+    """
+      Load a model with its linear layers quantized to int8, for running on the cpu
+
+      Quantizing takes a while, so the quantized model is saved next to the
+      original the first time and simply loaded after that.
+    """
+    import torch
+    path = self.quantized_path(name)
+    if os.path.exists(path) and not self.args.reset:
+      return torch.load(path, map_location='cpu', weights_only=False)
+
+    model = getattr(self, 'load_' + name)()
+    if model is None: return None
+    with self.logger.timer(f"Quantized model for {name}"):
+      model = quantize(model.to('cpu'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path) as f: torch.save(model, f)
+    return model
+
   def fetch_detect(self):
     """Fetch the pyannotate diarization model used for detecting speakers"""
     with self.logger.timer("Loaded libraries"):
@@ -84,6 +162,108 @@ class Models:
     self.logger.info("No saving implemented")
 
   def fetch_emotions(self):
-    """Fetch the emotion-detection module for Ekman emotions"""
-    self.logger.info("No saving implemented")
+    """Fetch both emotion-detection models for Ekman emotions, so --emotion-source can switch without going online"""
+    with self.logger.timer("Loaded libraries"):
+      from transformers import AutoFeatureExtractor, AutoModelForAudioClassification
+      from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    AutoFeatureExtractor.from_pretrained(self.sources['emotions'][0], cache_dir=self.path('emotions'))
+    AutoModelForAudioClassification.from_pretrained(self.sources['emotions'][0], cache_dir=self.path('emotions'))
+    AutoTokenizer.from_pretrained(self.text_sources['emotions'][0], cache_dir=self.path('emotions'))
+    AutoModelForSequenceClassification.from_pretrained(self.text_sources['emotions'][0], cache_dir=self.path('emotions'))
+
+  @staticmethod
+  def device() -> 'torch.device':
+    """use gpu acceleration if possible"""
+    import torch
+    return torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+
+  def load_detect(self):
+    """Load the pyannotate diarization pipeline onto the best device we have"""
+    # these libraries are slow to load (like 8 or 9 seconds!)
+    # so I only load them as needed
+    with self.logger.timer("Loaded libraries"):
+      from pyannote.audio import Pipeline
+
+    hf_token = os.getenv('HUGGINGFACE_TOKEN')
+    pipeline = Pipeline.from_pretrained(
+      self.sources['detect'][0],
+      cache_dir=self.path('detect'),
+      use_auth_token=hf_token
+    )
+    # onnxruntime runs on the cpu, so the rest of the pipeline has to be there too
+    device = self.device()
+    if self.backend == 'onnx':
+      import torch
+      from .onnx_models import use_onnx
+      device = torch.device('cpu')
+      with self.logger.timer("Loaded onnx networks"):
+        onnx = use_onnx(pipeline, self.path('detect'))
+      self.logger.info(f"Running {', '.join(onnx) or 'nothing'} in onnxruntime")
+      if len(onnx) < 2: self.logger.warning("Run ./bin/models --onnx to export the rest, which stay in torch for now")
+
+    self.logger.info(f"Using {device}")
+    with self.logger.timer("Initialized pipeline"):
+      pipeline.to(device)
+    return pipeline
+
+  def export_detect(self) -> list[str]:
+    """Export the networks of the diarization pipeline to ONNX, next to the model"""
+    from .onnx_models import export
+    backend, self.backend = self.backend, 'torch'
+    try:
+      pipeline = self.load_detect()
+    finally:
+      self.backend = backend
+    with self.logger.indent("Exporting diarization networks to ONNX", True):
+      return export(pipeline, self.path('detect'))
+
+  def load_transcribe(self):
+    """Load the whisper model for voice transcription"""
+    with self.logger.timer("Loaded libraries"):
+      import whisper
+    return whisper.load_model(self.sources['transcribe'][0], download_root=self.path('transcribe'))  # "base", "small", "medium", or "large"
+
+  def load_emotions(self):
+    """Load the emotion-detection model for Ekman emotions - the audio one on the best device we have, the text one on the cpu"""
+    with self.logger.timer("Loaded libraries"):
+      from transformers import AutoModelForAudioClassification, AutoModelForSequenceClassification
+    if self.emotion_source == 'text':
+      model = AutoModelForSequenceClassification.from_pretrained(self.source('emotions')[0], cache_dir=self.path('emotions'))
+      return model.to('cpu').eval()
+    model = AutoModelForAudioClassification.from_pretrained(self.source('emotions')[0], cache_dir=self.path('emotions'))
+    return model.to(self.device()).eval()
+
+  def processor(self, name: str):
+    """The feature extractor (or tokenizer) that goes with a transformers model, loaded once per process like the models"""
+    source = self.source(name)[0]
+    key = (name, self.path(name), source)
+    if key not in Models.loaded:
+      from transformers import AutoFeatureExtractor, AutoTokenizer
+      auto = AutoTokenizer if name == 'emotions' and self.emotion_source == 'text' else AutoFeatureExtractor
+      Models.loaded[key] = auto.from_pretrained(source, cache_dir=self.path(name))
+    return Models.loaded[key]
+
+
+def quantize(model):
+  """
+    Dynamically quantize the linear layers of a torch model to int8
+
+    Libraries like whisper subclass nn.Linear (just to cast the weights),
+    and torch only quantizes plain nn.Linear, so those become plain ones first.
+  """
+  import torch
+  for module in model.modules():
+    if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+      module.__class__ = torch.nn.Linear
+  return torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
 
+@functools.lru_cache(maxsize=None)
+def library_version(library: str) -> str:
+  """The installed version of a library, or None - finding it reads package metadata, so it is only done once"""
+  from importlib.metadata import version, PackageNotFoundError
+  try:
+    return version(library)
+  except PackageNotFoundError:
+    return None
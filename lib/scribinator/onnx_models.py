@@ -0,0 +1,133 @@
+import os
+
+from ege.logging import setup_logging
+from ege.utils import atomic_write
+
+"""
+  pyannote's networks run through onnxruntime instead of eager torch
+
+  The diarization pipeline spends nearly all of its time in two networks: the
+  segmentation model, which finds who speaks in each 10 second chunk, and the
+  speaker embedding model. Both can be exported to ONNX once, into the detect
+  model folder, and then run by onnxruntime, which is a good deal faster on
+  a cpu.
+
+  Only the networks are swapped out - the forward() of each is pointed at an
+  onnxruntime session - so everything else pyannote does with them (batching,
+  aggregation, clustering) is unchanged. A network that was not exported,
+  or that onnxruntime cannot load, just stays in torch.
+
+  The embedding model computes its filterbank features with torch.vmap,
+  which does not export, so those stay in torch and only the resnet that
+  does the work runs in onnxruntime.
+"""
+
+SEGMENTATION = 'segmentation.onnx'
+EMBEDDING = 'embedding.onnx'
+
+
+def networks(pipeline) -> dict:
+  """The torch networks of a pyannote diarization pipeline, by the file they export to"""
+  return {
+    SEGMENTATION: pipeline._segmentation.model,
+    EMBEDDING: pipeline._embedding.model_,
+  }
+
+
+def export(pipeline, dir: str) -> list[str]:
+  """Export the networks of the pipeline as ONNX files in dir, returning the paths of the ones that worked"""
+  import torch
+
+  logger = setup_logging()
+  os.makedirs(dir, exist_ok=True)
+  nets = networks(pipeline)
+
+  # one chunk of the length the segmentation model was trained on
+  segmentation = nets[SEGMENTATION].cpu().eval()
+  waveforms = torch.zeros(1, 1, int(segmentation.specifications.duration * segmentation.audio.sample_rate))
+  with torch.no_grad(): frames = segmentation(waveforms).shape[1]
+
+  class Embedding(torch.nn.Module):
+    """Just the resnet of the embedding model, and just the embedding it returns"""
+    def __init__(self, model) -> None:
+      super().__init__()
+      self.resnet = model.resnet
+
+    def forward(self, fbank: torch.Tensor, weights: torch.Tensor) -> torch.Tensor:
+      return self.resnet(fbank, weights=weights)[1]
+
+  embedding = nets[EMBEDDING].cpu().eval()
+  jobs = {
+    SEGMENTATION: (segmentation, (waveforms,), ['waveforms'], ['scores'], {
+      'waveforms': {0: 'batch', 2: 'samples'},
+      'scores': {0: 'batch', 1: 'frames'},
+    }),
+    EMBEDDING: (Embedding(embedding), (embedding.compute_fbank(waveforms), torch.ones(1, frames)), ['fbank', 'weights'], ['embeddings'], {
+      'fbank': {0: 'batch', 1: 'frames'},
+      'weights': {0: 'batch', 1: 'weight_frames'},
+      'embeddings': {0: 'batch'},
+    }),
+  }
+
+  ret = []
+  for name, (model, inputs, input_names, output_names, dynamic_axes) in jobs.items():
+    path = os.path.join(dir, name)
+    try:
+      with torch.no_grad(), logger.timer(f"Exported {name}"), atomic_write(path) as f:
+        torch.onnx.export(
+          model, inputs, f,
+          input_names=input_names, output_names=output_names, dynamic_axes=dynamic_axes,
+          opset_version=17
+        )
+      ret.append(path)
+    except Exception as e:
+      logger.warning(f"Could not export {name}, so it will stay in torch: {e}")
+  return ret
+
+
+def session(path: str):
+  """An onnxruntime session for the model at path, tuned for the cpu"""
+  import onnxruntime as ort
+  options = ort.SessionOptions()
+  options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+  return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+
+def run(s, **inputs) -> 'torch.Tensor':
+  """Run an onnxruntime session on torch tensors, returning its first output as a torch tensor"""
+  import torch
+  return torch.from_numpy(s.run(None, {k: v.detach().cpu().numpy() for k, v in inputs.items()})[0])
+
+
+def segmentation_forward(s):
+  """A forward() for the segmentation model that runs in onnxruntime"""
+  def forward(waveforms):
+    return run(s, waveforms=waveforms)
+  return forward
+
+
+def embedding_forward(model, s):
+  """A forward() for the embedding model that runs its resnet in onnxruntime"""
+  original = model.forward
+  def forward(waveforms, weights=None):
+    # an unweighted embedding pools differently, and only happens when pyannote probes the model
+    if weights is None: return original(waveforms)
+    return run(s, fbank=model.compute_fbank(waveforms), weights=weights)
+  return forward
+
+
+def use_onnx(pipeline, dir: str) -> list[str]:
+  """Run what networks of the pipeline were exported to dir through onnxruntime, returning the ones that are"""
+  logger = setup_logging()
+  ret = []
+  for name, model in networks(pipeline).items():
+    path = os.path.join(dir, name)
+    if not os.path.exists(path): continue
+    try:
+      s = session(path)
+    except Exception as e:
+      logger.warning(f"Could not load {name} into onnxruntime, so it will stay in torch: {e}")
+      continue
+    model.forward = segmentation_forward(s) if name == SEGMENTATION else embedding_forward(model, s)
+    ret.append(name)
+  return ret
@@ -0,0 +1,121 @@
+import json, os, struct
+from contextlib import contextmanager
+
+from ege.utils import atomic_write
+
+"""
+  One file holding many small ones
+
+  A long recording makes thousands of segment clips and transcripts, which
+  are slow to create, copy, back up and check for. A pack keeps them all in a
+  single file with an index of where each one is.
+
+  Layout: a fixed header (magic, index offset, index length), then the
+  entries back to back, then a json index of {name: [offset, length]}.
+  New entries are appended after the old index, followed by a new index, and
+  only then is the header pointed at it - so a crash part way through leaves
+  the previous index, and everything it lists, intact.
+
+  Nothing is ever overwritten, so entries made again (after --reset-stage,
+  say) and the old indexes stay behind as dead space. Once that is most of
+  the file, the pack is written out afresh with just the live entries.
+"""
+
+MAGIC = b'SCRBPACK'
+HEADER = struct.Struct('<8sQQ')
+COMPACT = 0.5             # rewrite the pack once more than this share of it is dead space
+
+
+class Pack:
+  def __init__(self, path: str) -> None:
+    self.path = path
+    self._index = None
+
+  def index(self) -> dict[str, list[int]]:
+    """{name: [offset, length]} for everything in the pack"""
+    if self._index is None:
+      self._index = {}
+      if os.path.exists(self.path):
+        with open(self.path, 'rb') as f:
+          magic, offset, length = HEADER.unpack(f.read(HEADER.size))
+          if magic != MAGIC: raise ValueError(f'{self.path} is not a segment pack')
+          f.seek(offset)
+          self._index = json.loads(f.read(length)) if length > 0 else {}
+    return self._index
+
+  def __contains__(self, name: str) -> bool:
+    return name in self.index()
+
+  def locate(self, name: str) -> tuple[int, int]:
+    """The (offset, length) of an entry in the pack file"""
+    return tuple(self.index()[name])
+
+  def read(self, name: str) -> bytes:
+    offset, length = self.locate(name)
+    with open(self.path, 'rb') as f:
+      f.seek(offset)
+      return f.read(length)
+
+  def dead(self) -> int:
+    """Bytes of the pack nothing uses any more - entries made again, old indexes, torn writes"""
+    if not os.path.exists(self.path): return 0
+    with open(self.path, 'rb') as f: _, _, length = HEADER.unpack(f.read(HEADER.size))
+    live = HEADER.size + sum(size for _, size in self.index().values()) + length
+    return os.path.getsize(self.path) - live
+
+  def compact(self) -> None:
+    """Write the pack afresh with only the live entries, in the order they were added"""
+    index = {}
+    with open(self.path, 'rb') as src, atomic_write(self.path) as f:
+      f.write(HEADER.pack(MAGIC, 0, 0))
+      for name, (offset, length) in sorted(self.index().items(), key=lambda kv: kv[1][0]):
+        src.seek(offset)
+        index[name] = [f.tell(), length]
+        f.write(src.read(length))
+      data = json.dumps(index).encode()
+      offset = f.tell()
+      f.write(data)
+      f.seek(0)
+      f.write(HEADER.pack(MAGIC, offset, len(data)))
+    self._index = index
+
+  @contextmanager
+  def writer(self, every: int = 256):
+    """
+      Add entries with add(name, data). The index is saved every so many
+      entries and when the block ends, so a crash loses little work. Then
+      the pack is compacted if it has become mostly dead space.
+    """
+    index = self.index()
+    if not os.path.exists(self.path):
+      with open(self.path, 'wb') as f: f.write(HEADER.pack(MAGIC, 0, 0))
+
+    with open(self.path, 'r+b') as f:
+      pending = [0]
+
+      def commit():
+        f.seek(0, os.SEEK_END)
+        data = json.dumps(index).encode()
+        offset = f.tell()
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, offset, len(data)))
+        f.flush()
+        pending[0] = 0
+
+      def add(name: str, data: bytes) -> None:
+        f.seek(0, os.SEEK_END)
+        offset = f.tell()
+        f.write(data)
+        index[name] = [offset, len(data)]
+        pending[0] += 1
+        if pending[0] >= every: commit()
+
+      try:
+        yield add
+      finally:
+        if pending[0] > 0: commit()
+
+    if self.dead() > COMPACT * os.path.getsize(self.path): self.compact()
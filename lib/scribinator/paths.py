@@ -2,10 +2,12 @@ import os.path
 from _ctypes import ArgumentError
 
 from ege.utils import remove_extension
+from .pack import Pack
 class Paths:
   def __init__(self, args: 'argparse.Namespace', path: str) -> None:
     """Create a class handling where everything is supposed to go"""
     self.args = args
+    self._pack = None
 
     r = remove_extension(path)
     self.paths: Dict[str, str] = {
@@ -14,7 +16,14 @@ class Paths:
       'segments':   os.path.join(r, "segments"),
       'meta':       os.path.join(r, "meta.json"),
       'audio':      os.path.join(r, "all.mp3"),
+      'pcm':        os.path.join(r, "all.npy"),
       'json':       os.path.join(r, "all.json"),
+      'speech':     os.path.join(r, "speech.json"),
+      'speakers':   os.path.join(r, "speakers.npz"),
+      'voices':     os.path.join(r, "voices.npy"),
+      'pack':       os.path.join(r, "segments.pack"),
+      'manifest':   os.path.join(r, "manifest.json"),
+      'metrics':    os.path.join(r, "metrics.jsonl"),
       'html':       os.path.join(r, "index.html")
     }
 
@@ -24,15 +33,38 @@ class Paths:
     if number < 0 : raise ValueError(f'{name} requires a number 0 and above')
     if not isinstance(number, int): raise ValueError(f'{name} requires an integer for number')
 
-  def path(self, name: str, number=None) -> str:
-    if name == 'segment_audio':
-      self.test_number(name, number)
-      return os.path.join(self.path('segments'), f'{number}.mp3')
+  def rel(self, name: str, number: int) -> str:
+    """The path of a per-segment file, relative to the project root"""
+    self.test_number(name, number)
+    if name == 'segment_audio': return os.path.join('segments', f'{number}.wav')
+    if name == 'segment_info': return os.path.join('segments', f'{number}.json')
+    if name == 'segment_transcript': return os.path.join('segments', f'{number}_transcript.json')
+    if name == 'segment_emotions': return os.path.join('segments', f'{number}_emotions.json')
+    raise KeyError(name)
 
-    if name == 'segment_info':
-      self.test_number(name, number)
-      return os.path.join(self.path('segments'), f'{number}.json')
+  def path(self, name: str, number=None) -> str:
+    if name.startswith('segment_'):
+      return os.path.join(self.path('root'), self.rel(name, number))
 
     if number is not None: raise ValueError(f'no number allowed for {name}')
 
     return self.paths[name]
+
+  def packed(self) -> bool:
+    """Are the per-segment files kept in a single pack rather than loose in segments/?"""
+    return getattr(self.args, 'pack', False)
+
+  def pack(self) -> Pack:
+    if self._pack is None: self._pack = Pack(self.path('pack'))
+    return self._pack
+
+  def locate(self, name: str, number=None) -> tuple[str, int, int]:
+    """
+      Where the bytes of something actually are, as (file, offset, length)
+      Packed segment files are a range of the pack; everything else is a whole file
+    """
+    if name.startswith('segment_') and self.packed():
+      rel = self.rel(name, number)
+      if rel in self.pack(): return (self.path('pack'), *self.pack().locate(rel))
+    path = self.path(name, number)
+    return path, 0, os.path.getsize(path)
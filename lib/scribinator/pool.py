@@ -0,0 +1,88 @@
+import argparse, multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator
+
+from ege.logging import setup_logging
+
+"""
+  Transcription spread across a pool of worker processes
+
+  On a machine without a GPU, one process running whisper leaves most of the
+  cores idle. Here each worker loads whisper once when it starts, gets its
+  fair share of the cores, and reads its clips straight out of the shared
+  memory-mapped samples, so only the start and end of each segment are sent
+  to it and only the text comes back.
+
+  The segments go out longest first, a batch at a time. A long segment taken
+  up last would leave every other worker waiting on it, while the short ones
+  at the end fill in around whatever is still running.
+"""
+
+# what each worker loaded when it started
+worker: dict = {}
+
+
+def longest_first(lengths: list[float], batch_size: int) -> list[list[int]]:
+  """Split the indexes of lengths into batches of up to batch_size, the longest ones first"""
+  order = sorted(range(len(lengths)), key=lambda i: (-lengths[i], i))
+  batch_size = max(1, batch_size)
+  return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def worker_start(args: 'argparse.Namespace', pcm: str, threads: int, verbosity: int) -> None:
+  """Set up a worker process, loading whisper and the samples once for all the batches it gets"""
+  from .audio import Audio
+  from .batch import limit_threads
+  from .cli import set_verbosity
+  from .models import Models
+  from .transcriber import Transcriber
+
+  set_verbosity(verbosity)
+  if getattr(args, 'trace', None): setup_logging().tracing(args.trace)
+  limit_threads(threads)
+  worker['audio'] = Audio(pcm)
+  worker['transcriber'] = Transcriber(
+    Models(args).load('transcribe'),
+    getattr(args, 'batch_size', 16),
+    getattr(args, 'combine', False)
+  )
+
+
+def worker_run(batch: list[tuple[int, float, float]]) -> list[tuple[int, dict]]:
+  """Transcribe a batch of (segment, start, end) in a worker"""
+  audio = worker['audio']
+  with setup_logging().span("Transcribing batch", seconds=round(sum(end - start for _, start, end in batch), 3)) as span:
+    results = worker['transcriber'].transcribe([audio.clip(start, end) for _, start, end in batch])
+    span.items = len(batch)
+  return [(i, result) for (i, _, _), result in zip(batch, results)]
+
+
+class TranscriptionPool:
+  """Transcribe segments with a pool of worker processes, each with its own copy of whisper"""
+
+  def __init__(self, args: 'argparse.Namespace', workers: int) -> None:
+    self.args = args
+    self.workers = max(1, workers)
+    self.threads = max(1, (os.cpu_count() or 1) // self.workers)
+    self.batch_size = max(1, getattr(args, 'batch_size', 16))
+
+  def transcribe(self, pcm: str, spans: dict[int, tuple[float, float]]) -> Iterator[tuple[int, dict]]:
+    """
+      Transcribe the segments {i: (start, end)} of the samples in pcm
+
+      Each (i, {'language', 'text'}) is handed over as soon as its batch is
+      done, in whatever order they finish.
+    """
+    keys = list(spans)
+    batches = longest_first([spans[i][1] - spans[i][0] for i in keys], self.batch_size)
+
+    # the parent has already got torch going, which does not survive a fork
+    with ProcessPoolExecutor(
+      self.workers,
+      mp_context=multiprocessing.get_context('spawn'),
+      initializer=worker_start,
+      initargs=(self.args, pcm, self.threads, getattr(self.args, 'verbosity', 2))
+    ) as pool:
+      futures = [pool.submit(worker_run, [(keys[k], *spans[keys[k]]) for k in batch]) for batch in batches]
+      for future in as_completed(futures):
+        yield from future.result()
@@ -4,6 +4,7 @@ from typing import Dict, Any
 
 from ege.logging import setup_logging
 from ege.utils import recursive_copy, remove_extension, pp
+from .audio import Audio, decode
 from .paths import Paths
 
 class Project:
@@ -48,8 +49,10 @@ class Project:
 
     # first set up default values based on knowing nothing
     self.logger.info(self.paths.path('source'))
+    # linux keeps no creation time, so the last change will have to do there
+    st = os.stat(self.paths.path('source'))
     dt = datetime.datetime.fromtimestamp(
-      os.stat(self.paths.path('source')).st_birthtime
+      getattr(st, 'st_birthtime', st.st_mtime)
     ).strftime('%Y-%m-%d %H:%M:%S')
     self._meta = {
       'title': os.path.basename(self.paths.path('root')),
@@ -114,5 +117,14 @@ class Project:
         modification_time = os.path.getmtime(self.paths.path('source'))
         os.utime(self.paths.path('audio'), (creation_time, modification_time))
 
+    # and decode it, once, for every stage to share
+    if not os.path.exists(self.paths.path('pcm')):
+      with self.logger.timer("Decoded audio file"):
+        decode(self.paths.path('source'), self.paths.path('pcm'))
+
     # save the meta file
-    self.meta()
\ No newline at end of file
+    self.meta()
+
+  def duration(self) -> float:
+    """Length of the project audio in seconds"""
+    return Audio(self.paths.path('pcm')).duration
@@ -1,4 +1,7 @@
+import json, os, platform, subprocess
+
 from ege.logging import setup_logging
+from ege.utils import format_elapsed_time, greek_letters
 
 from .models import Models
 from .paths import Paths
@@ -34,18 +37,69 @@ class Scribinator:
     self.segments = Segments(args, path)
 
   def run(self):
-    # set up the project
-    self.project.run()
-
-    # create the segment annotations
-    s = self.segments
-    s.detect()
-    s.extract()
-    s.transcribe()
-    s.emotions()
+    # every step is timed into metrics.jsonl, against the length of the recording
+    metrics = self.logger.metrics(self.paths.path('metrics'), file=self.paths.path('source'), audio=self.project.duration())
+    with metrics, self.logger.indent(f"Processing {self.paths.path('source')}"):
+      # create the segment annotations
+      s = self.segments
+      if getattr(self.args, 'stream', False):
+        s.stream()
+      else:
+        s.detect()
+        s.extract()
+        s.transcribe()
+        s.emotions()
 
-    # then create the output files - probably built in another class
-    # self.project.cleanup() or self.editor.run()
+      # then create the output files
+      self.simple_txt()
+      self.cache_file()
+      if getattr(self.args, 'open', True): self.open_result()
 
+  def simple_txt(self) -> None:
+    """Write a plain-text transcript, one line per segment"""
+    ret = []
+    for segment in self.segments.segments:
+      text = segment['transcript'].strip()
+      if not text: continue
+      start_time = format_elapsed_time(segment['start'])
+      elapsed_time = format_elapsed_time(segment['end'] - segment['start'])
+      ret.append(f"{start_time} for {elapsed_time} [Speaker {segment['speaker']:02}]: {text}")
+    with open(os.path.join(self.paths.path('root'), "transcript.txt"), 'w') as f:
+      f.write('\n'.join(ret))
 
+  def cache_file(self) -> None:
+    """
+    Create the cache.js file in our output directory
+    This file has a dictionary of the results of all analysis we have done
+    """
+    info = dict(self.project.meta())
+    segments = self.segments.segments
+    s = info['speakers_segments'] = [s['speaker'] for s in segments]
+    s = sorted(list(set(s)))
+    # people the speaker library knows by voice get their names
+    names = self.segments.names()
+    info['speakers_all'] = [names.get(v) or greek_letters(v) for v in s]
+    info['segments'] = segments
+    # packed clips are a byte range of segments.pack, which the page fetches directly
+    if self.paths.packed():
+      for i, segment in enumerate(segments):
+        _, offset, length = self.paths.locate('segment_audio', i)
+        segment['pack_audio'] = [offset, length]
+    js = 'document.transcriptionator = {};\n'
+    js += 'document.transcriptionator.results = '
+    js += json.dumps(info, indent=2)
+    path = os.path.join(self.paths.path('root'), 'cache.js')
+    with open(path, 'w') as f: f.write(js)
+    os.chmod(path, 0o644)
 
+  def open_result(self) -> None:
+    """Open the results in a web browser"""
+    path = self.paths.path('html')
+    if platform.system() == "Darwin":
+      subprocess.run(['open', path])
+    elif platform.system() == "Windows":
+      subprocess.run(['start', path], shell=True)
+    elif platform.system() == "Linux":
+      subprocess.run(['xdg-open', path])
+    else:
+      self.logger.warning(f"Results are in {self.paths.path('root')}")
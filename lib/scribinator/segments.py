@@ -1,155 +1,609 @@
-from transformers import AutoModel
+import json, os, threading, time, warnings, wave
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from io import BytesIO
+from itertools import islice
+from typing import Iterator
+
+import numpy as np
 
 from ege.logging import setup_logging
-from ege.utils import format_elapsed_time, pp
+from ege.utils import atomic_write, format_elapsed_time, pp
 
+from .audio import Audio, SAMPLE_RATE
+from .cache import Cache, hash_audio
+from .diarization import Capture, diarize, recluster
+from .emotions import BATCH_SIZE, SCORERS, Scorer
+from .library import Library
+from .manifest import Manifest
+from .models import Models
 from .paths import Paths
+from .pool import TranscriptionPool
+from .spans import Spans
+from .stream import Inbox, stream
+from .transcriber import Transcriber
+from .vad import Speech, detect_speech, MIN_SILENCE
 
 
 class Segments:
+  # what --reset-stage calls each stage, and the result it makes
+  stages: dict = {
+    'detect': 'detect',
+    'extract': 'segment_audio',
+    'transcribe': 'segment_transcript',
+    'emotions': 'segment_emotions',
+  }
+
   def __init__(self, args: 'argparse.Namespace', path: str) -> None:
     self.args = args
     self.paths = Paths(args, path)
     self.logger = setup_logging()
     self.models = Models(self.args)
+    self.manifest = Manifest(self.paths.path('manifest'))
     self.segments = []
+    self._audio = None
+    self._audio_hash = None
+
+  @staticmethod
+  def merge(turns, max_gap: float = None) -> list:
+    """
+      Collapse (start, end, speaker) turns where the same speaker is two or more times in a row.
+      With max_gap, turns further apart than that stay separate, so the silence between them is left out.
+    """
+    return list(Segments.merging(turns, max_gap))
 
   @staticmethod
-  def merge(diarization):
-    """Collapse segments where the same speaker is two or more times in a row."""
-    ret = {}
+  def merging(turns, max_gap: float = None) -> Iterator[dict]:
+    """merge(), yielding each segment as soon as the turn after it shows it is finished"""
+    count = 0
     current_speaker = current_start = current_end = None
-    for turn, _, speaker in diarization.itertracks(yield_label=True):
-      if speaker != current_speaker:
+    for start, end, speaker in turns:
+      gap = max_gap is not None and current_end is not None and start - current_end >= max_gap
+      if speaker != current_speaker or gap:
         if current_speaker is not None:
-          ret.append({
-            'segment': i,
+          yield {
+            'segment': count,
             'start': current_start,
             'end': current_end,
             'speaker': current_speaker,
-          })
+          }
+          count += 1
         current_speaker = speaker
-        current_start = turn.start
-        current_end = turn.end
+        current_start = start
+        current_end = end
       else:
-        current_end = turn.end
+        current_end = end
     # Append the last segment
     if current_speaker is not None:
-      ret.append({
-        'segment': i,
+      yield {
+        'segment': count,
         'start': current_start,
         'end': current_end,
         'speaker': current_speaker,
-      })
-    return ret
+      }
 
-  def detect(self) -> None:
+  def detect(self) -> list:
     """Detect who is speaking when - these are defined as our segments of the audio"""
     # if we've already done the hard work of finding the segments,
     # just return the cache
-    if os.path.exists(self.paths.path('json')) and not self.args.reset:
-      with open(self.paths_json, 'r') as f: ret = json.load(f)
+    if not self.outdated('detect'):
+      with open(self.paths.path('json'), 'r') as f: self.segments = json.load(f)
       self.logger.info("Loaded speakers")
-      return ret
+      return self.segments
 
     # otherwise we have some computationally expensive tasks to do
-    # Detect device (MPS for Apple Silicon or CPU)
     with self.logger.indent("Detecting Speakers"):
-      # these libraries are slow to load (like 8 or 9 seconds!)
-      # so I only load them as needed
-      with self.logger.timer("Loaded libraries"):
-        from pyannote.audio import Pipeline
-
-      # use gpu acceleration if possible
-      nm = "mps" if torch.backends.mps.is_available() else "cpu"
-      self.logger.info(f"Using {nm}")
-      device = torch.device(nm)
-
-      # Load pre-trained Pyannote diarization model
-      hf_token = os.getenv('HUGGINGFACE_TOKEN')
-      pipeline = Pipeline.from_pretrained(
-        "pyannote/speaker-diarization-3.1",
-        #cache_dir='models',
-        cache_dir=self.models.path('detect'),
-        use_auth_token=hf_token
-      )
-      with self.logger.timer("Initialized pipeline"):
-        pipeline.to(device)
+      # Merge contiguous speaker segments, but never across silence we cut out
+      self.segments = self.merge(self.turns(), self.max_gap())
+
+      with self.logger.timer("Saved"):
+        self.save_speakers()
+    return self.segments
+
+  def save_speakers(self) -> None:
+    """Save who speaks when, and what it was found from"""
+    with open(self.paths.path('json'), 'w') as f:
+      json.dump([{k: segment[k] for k in ['segment', 'start', 'end', 'speaker']} for segment in self.segments], f)
+    self.note('detect')
+    self.manifest.save()
+
+  def result(self, name: str, i: int = None) -> str:
+    """The project-relative path of a result, as the manifest knows it"""
+    if name == 'detect': return os.path.relpath(self.paths.path('json'), self.paths.path('root'))
+    return self.paths.rel(name, i)
+
+  def audio_hash(self) -> str:
+    """The hash of what the project sounds like - only worked out again when all.npy changes"""
+    if self._audio_hash is None:
+      # the manifest keeps the hash with the size and time of the file it came from
+      name = os.path.relpath(self.paths.path('pcm'), self.paths.path('root'))
+      stat = os.stat(self.paths.path('pcm'))
+      stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+      known = self.manifest.get(name)
+      if known is not None and known.rsplit(':', 1)[0] == stamp:
+        self._audio_hash = known.rsplit(':', 1)[1]
+      else:
+        with self.logger.timer("Hashed audio"):
+          self._audio_hash = hash_audio(self.paths.path('pcm'))
+        self.manifest.set(name, f"{stamp}:{self._audio_hash}")
+        self.manifest.save()
+    return self._audio_hash
+
+  def made_with(self, name: str, i: int = None) -> dict:
+    """Everything that goes into a result: the audio (and the span of it), the model, and the settings"""
+    ret = {'audio': self.audio_hash()}
+    if name == 'detect':
+      ret['model'] = self.models.fingerprint('detect')
+      ret['params'] = {
+        'window': getattr(self.args, 'window', 0),
+        'overlap': getattr(self.args, 'overlap', 30),
+        'vad': getattr(self.args, 'vad', False)
+      }
+      return ret
+    ret['span'] = [self.segments[i]['start'], self.segments[i]['end']]
+    if name == 'segment_audio': return ret
+    if name == 'segment_transcript':
+      ret['model'], ret['params'] = self.transcribed_with()
+      return ret
+    if name == 'segment_emotions':
+      ret['model'] = self.models.fingerprint('emotions')
+      # text emotions change with the transcript
+      ret['params'] = {'transcript': self.segments[i].get('transcript') if self.models.emotion_source == 'text' else None}
+      return ret
+    raise KeyError(name)
+
+  def fingerprint(self, name: str, i: int = None) -> str:
+    """A hash of everything that goes into a result"""
+    return Cache.key(*self.made_with(name, i).values())
+
+  def note(self, name: str, i: int = None) -> None:
+    """Put what made a result in the manifest, next to its hash"""
+    made_with = self.made_with(name, i)
+    self.manifest.set(self.result(name, i), Cache.key(*made_with.values()), made_with)
+
+  def transcribed_with(self) -> tuple:
+    """The model and settings that go into a transcript"""
+    return (
+      self.models.fingerprint('transcribe'),
+      {'engine': getattr(self.args, 'engine', 'segments'), 'combine': getattr(self.args, 'combine', False)}
+    )
+
+  def spans(self) -> tuple[Cache, str, Spans]:
+    """Earlier transcripts of this audio by this model, found by span - with the cache and key to put them back"""
+    cache = Cache(self.args, 'transcribe')
+    key = Cache.key(self.audio_hash(), *self.transcribed_with())
+    # a reset means transcribing anew, so none of them count
+    return cache, key, Spans(None if self.reset('transcribe') else cache.get(key))
+
+  def reuse(self, spans: Spans, todo: list[int], save) -> list[int]:
+    """Save the transcripts we already have for the segments in todo, returning the ones still to do"""
+    ret = []
+    for i in todo:
+      j = spans.find(self.segments[i]['start'], self.segments[i]['end'])
+      if j is None:
+        ret.append(i)
+      else:
+        save('segment_transcript', i, json.dumps(j).encode())
+    return ret
+
+  def reset(self, stage: str) -> bool:
+    """Was a stage asked to be redone from scratch, with --reset or --reset-stage?"""
+    return self.args.reset or stage in (getattr(self.args, 'reset_stage', None) or [])
+
+  def outdated(self, name: str, i: int = None) -> bool:
+    """Does a result need to be (re)made - it is missing, was asked to be reset, or was made from something else?"""
+    if self.args.reset: return True
+    if name in [self.stages[stage] for stage in getattr(self.args, 'reset_stage', None) or []]: return True
+    exists = os.path.exists(self.paths.path('json')) if name == 'detect' else self.stored(name, i)
+    return not exists or self.manifest.get(self.result(name, i)) != self.fingerprint(name, i)
+
+  def max_gap(self) -> float:
+    """The longest silence a segment can span - none when it was cut out by the vad"""
+    return MIN_SILENCE if getattr(self.args, 'vad', False) else None
+
+  def turns(self) -> Iterator[tuple[float, float, int]]:
+    """
+      Find who speaks when, yielding (start, end, speaker) turns in time order
+
+      Windowed diarization yields the turns of each window as soon as it is
+      done. Everything found is put in the shared cache at the end, and is
+      read back from there unless the speakers were asked to be reset.
+    """
+    # maybe we have seen this audio before, under whatever name
+    window = getattr(self.args, 'window', 0)
+    overlap = getattr(self.args, 'overlap', 30)
+    vad = getattr(self.args, 'vad', False)
+    cache = Cache(self.args, 'detect')
+    key = self.fingerprint('detect')
+    # a reset means finding them anew, which also saves what recluster() needs
+    cached = None if self.reset('detect') else cache.get(key)
+    # older entries are just the turns
+    if isinstance(cached, list): cached = {'turns': cached, 'voices': None}
+
+    if cached is not None:
+      self.logger.info("Loaded speakers from the cache")
+      if cached['voices'] is not None: self.save_voices(cached['voices'])
+      yield from cached['turns']
+    else:
+      # the model is only loaded once per process, and kept warm by bin/server
+      pipeline = self.models.load('detect')
+      audio = self.audio()
+
+      # skip the silence so pyannote only has to look at the speech
+      if vad:
+        with self.logger.timer("Found speech"):
+          audio = Speech(audio, detect_speech(audio))
+          with open(self.paths.path('speech'), 'w') as f: json.dump(audio.regions, f)
+        self.logger.info(f"Speech is {audio.duration / max(audio.audio.duration, 1e-9):.0%} of the audio")
 
       # Apply diarization to the audio file to get speakers
+      # Long recordings are diarized a window at a time so memory stays flat
       # I cannot set weights_only=True in torchaudio, so just supress this warning for now
       with self.logger.indent("Calling speakers", True):
         self.logger.info("NB: this may take a while for large files")
         warnings.filterwarnings(action='ignore', message='You are using `torch.load`')
-        waveform, sample_rate = torchaudio.load(self.path_audio)  # , weights_only=True)
-        diarization = pipeline({
-          "waveform": waveform,
-          "sample_rate": sample_rate
-        })
-
-      # Merge contiguous speaker segments
-      self.segments = self.merge_segments(diarization)
-      with self.logger.timer("Saved"):
-        with open(self.path_json, 'w') as f:
-          json.dump(self.segments, f)
+        turns = []
+        # keep what the clustering works from, so recluster() can redo just that
+        capture = Capture()
+        if audio.duration > 0:
+          for turn in self.timeline(audio, diarize(pipeline, audio, window=window, overlap=overlap, capture=capture)):
+            turns.append(turn)
+            yield turn
+          capture.save(self.paths.path('speakers'))
+      self.save_voices(capture.voices)
+      cache.put(key, {'turns': turns, 'voices': [v.tolist() for v in capture.voices]})
+
+  @staticmethod
+  def timeline(audio, turns) -> Iterator[tuple[float, float, int]]:
+    """Put turns found in the speech only (when the vad cut out the silence) back on the timeline of the whole recording"""
+    for start, end, speaker in turns:
+      pieces = audio.pieces(start, end) if isinstance(audio, Speech) else [(start, end)]
+      for s, e in pieces: yield s, e, speaker
+
+  def recluster(self, threshold: float = None, **speakers) -> list:
+    """
+      Cluster the speakers again, into num_speakers (or between min_speakers and max_speakers) of them
+
+      This reuses the embeddings the last detect() saved, so none of the
+      neural networks run. The new speakers replace the old ones, and the
+      steps after this are redone only for the segments that changed.
+    """
+    if not os.path.exists(self.paths.path('speakers')):
+      # it is only saved when pyannote runs, not when the speakers come out of the shared cache
+      raise FileNotFoundError(f"{self.paths.path('speakers')} is missing - find the speakers anew with --reset-stage detect first")
+
+    pipeline = self.models.load('detect')
+    audio = self.audio()
+    if getattr(self.args, 'vad', False):
+      with open(self.paths.path('speech'), 'r') as f: audio = Speech(audio, [tuple(r) for r in json.load(f)])
 
-  def abs_from_rel(self, rel):
+    with self.logger.timer("Clustered speakers"):
+      voices = []
+      turns = list(self.timeline(audio, recluster(pipeline, self.paths.path('speakers'), threshold, voices, **speakers)))
+      self.segments = self.merge(turns, self.max_gap())
+      self.save_voices(voices)
+    self.logger.info(f"Found {len(set(s['speaker'] for s in self.segments))} speakers in {len(self.segments):,} segments")
+    self.save_speakers()
+    return self.segments
+
+  def save_voices(self, voices: list) -> None:
+    """Keep the voice print of each speaker, a row per speaker number"""
+    with atomic_write(self.paths.path('voices')) as f: np.save(f, np.array(voices, dtype=np.float32))
+
+  def voices(self) -> 'np.ndarray':
+    """The (speakers, dimension) voice prints of the speakers, or None if we do not have them"""
+    if not os.path.exists(self.paths.path('voices')): return None
+    return np.load(self.paths.path('voices'))
+
+  def names(self) -> dict[int, str]:
+    """{speaker: name} for the speakers the library knows by voice"""
+    voices = self.voices()
+    if voices is None or len(voices) == 0: return {}
+    library = Library(self.args)
+    return {speaker: name for speaker, name in enumerate(library.match(voices)) if name is not None}
+
+  def enroll(self, library: Library, speaker: int, name: str) -> None:
+    """Add the voice of one of our speakers to the library, as name"""
+    voices = self.voices()
+    # older files keep zeros for speakers who never had a usable embedding
+    if voices is None or speaker >= len(voices) or np.isnan(voices[speaker]).any() or not voices[speaker].any():
+      raise ValueError(f"There is no voice print for speaker {speaker} in {self.paths.path('root')}")
+    with open(self.paths.path('json'), 'r') as f: segments = json.load(f)
+    seconds = sum(s['end'] - s['start'] for s in segments if s['speaker'] == speaker)
+    library.add(name, voices[speaker], seconds)
+
+  def audio(self) -> Audio:
+    """The decoded audio of the project, memory-mapped and shared by every stage"""
+    if self._audio is None:
+      # every stage gets read-only views, which torch warns about but never writes to
+      warnings.filterwarnings(action='ignore', message='The given NumPy array is not writable')
+      self._audio = Audio(self.paths.path('pcm'))
+    return self._audio
+
+  def samples(self, i: int) -> 'np.ndarray':
+    """A view of the samples of segment i - nothing is decoded or copied"""
+    return self.audio().clip(self.segments[i]['start'], self.segments[i]['end'])
+
+  def stored(self, name: str, i: int) -> bool:
+    """Do we already have this per-segment file, loose in segments/ or in the pack?"""
+    if self.paths.packed(): return self.paths.rel(name, i) in self.paths.pack()
+    return os.path.exists(self.paths.path(name, i))
+
+  def fetch(self, name: str, i: int) -> bytes:
+    """Read a per-segment file, wherever it is kept"""
+    if self.paths.packed(): return self.paths.pack().read(self.paths.rel(name, i))
+    with open(self.paths.path(name, i), 'rb') as f: return f.read()
+
+  @contextmanager
+  def storing(self):
     """
-      Convenience function to get the real path to various
-      segments files based on the path relative to the project
+      Get a save(name, i, data) function for per-segment files, loose or into the pack
+
+      Each one is noted in the manifest, which is saved when the block ends.
+      Anything saved but not yet in the manifest is just made again next time.
     """
-    return os.path.join(self.paths.path('segments'), os.path.basename(rel))
+    try:
+      if self.paths.packed():
+        with self.paths.pack().writer() as add:
+          def save(name: str, i: int, data: bytes) -> None:
+            add(self.paths.rel(name, i), data)
+            self.note(name, i)
+          yield save
+        return
+
+      def save(name: str, i: int, data: bytes) -> None:
+        # only ever show complete files under the real name
+        with atomic_write(self.paths.path(name, i)) as f: f.write(data)
+        self.note(name, i)
+      yield save
+    finally:
+      self.manifest.save()
 
   def extract(self):
     """Extract snippets of audio for each segment"""
 
     # add in the file name and figure which ones are outstanding
-    fmt = '{:0' + str(len(str(len(self.segments)))) + 'd}.mp3'
     todo = []
     for i in range(len(self.segments)):
       # the project relative path
-      relp = self.segments[i]['path_audio'] = os.path.join('segments', fmt.format(i))
-      # the absolute path
-      absp = self.abs_from_rel(relp)
+      self.segments[i]['path_audio'] = self.paths.rel('segment_audio', i)
       # do we need to run this one?
-      if not os.path.exists(absp) or self.args.reset: todo.append(i)
+      if self.outdated('segment_audio', i): todo.append(i)
 
     # nothing to do so skip the logging
     if len(todo) == 0: return
 
-    # extract the segments
+    # extract the segments - each clip is encoded straight from the shared
+    # samples and saved as soon as it is ready. Only a couple of clips per
+    # thread are in flight at once, so memory holds a few clips at most
     with self.logger.indent("Getting Segments", True):
-      # buffer all the IO up front for faster saves
-      audio = AudioSegment.from_mp3(self.path_audio)
-      segment_buffers = []
-
-      # Just get a list of the coordinates in the audio
-      with self.logger.timer("Buffering"):
-        for i in todo:
-          # Slice the segment and store it in a BytesIO buffer
-          start_ms = int(self.segments[i]['start'] * 1000)
-          end_ms = int(self.segments[i]['end'] * 1000)
-          segment_audio = audio[start_ms:end_ms]
-
-          # Use BytesIO to store audio in memory
-          buffer = BytesIO()
-          segment_audio.export(buffer, format='wav')
-          relp = self.segments[i]['path_audio']
-          absp = self.abs_from_rel(relp)
-          segment_buffers.append((absp, buffer))
-
-      with self.logger.progress("Writing", len(todo)) as prog:
-        # Now, export each buffered segment to disk
-        for path, buffer in segment_buffers:
-          with open(path, 'wb') as f:
-            f.write(buffer.getvalue())
-          buffer.close()
-          prog.next()
+      threads = min(8, os.cpu_count() or 1)
+      with self.storing() as save, ThreadPoolExecutor(threads) as pool:
+        with self.logger.progress("Writing", len(todo)) as prog:
+          pending = iter(todo)
+          futures = {}
+          for i in islice(pending, 2 * threads): futures[pool.submit(self.encode_clip, i)] = i
+          while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+              save('segment_audio', futures.pop(future), future.result())
+              prog.next()
+              for i in islice(pending, 1): futures[pool.submit(self.encode_clip, i)] = i
+
+  def encode_clip(self, i: int, chunk: int = 1 << 16) -> bytes:
+    """Encode segment i as a 16-bit wav file, a chunk of samples at a time"""
+    samples = self.samples(i)
+    buffer = BytesIO()
+    with wave.open(buffer, 'wb') as w:
+      w.setnchannels(1)
+      w.setsampwidth(2)
+      w.setframerate(SAMPLE_RATE)
+      for j in range(0, len(samples), chunk):
+        w.writeframes((np.clip(samples[j:j + chunk], -1, 1) * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
 
   def transcribe(self) -> None:
     """Transcribe the audio into text"""
-    pass
+    # add in the paths to the transcripts and figure which ones are outstanding
+    todo = []
+    for i in range(len(self.segments)):
+      self.segments[i]['path_transcript'] = self.paths.rel('segment_transcript', i)
+      if self.outdated('segment_transcript', i): todo.append(i)
+
+    if len(todo) > 0:
+      with self.logger.indent("Transcription"):
+        # segments covering audio that was transcribed before (under other segment numbers) get that back
+        cache, key, spans = self.spans()
+        count = len(todo)
+        with self.storing() as save: todo = self.reuse(spans, todo, save)
+        if len(todo) < count: self.logger.info(f"Reused the transcripts of {count - len(todo):,} segments")
+
+        if len(todo) > 0:
+          engine = getattr(self.args, 'engine', 'segments')
+          if engine == 'segments' and getattr(self.args, 'workers', 1) > 1:
+            # the workers each load their own whisper, so there is no need for one here
+            results = self.transcribe_pool(todo)
+          else:
+            results = getattr(self, 'transcribe_' + engine)(self.transcriber(), todo)
+          try:
+            with self.storing() as save, self.logger.progress("Transcribing", len(todo)) as prog:
+              # save each result as soon as the engine hands it over
+              for i, j in results:
+                save('segment_transcript', i, json.dumps(j).encode())
+                spans.add(self.segments[i]['start'], self.segments[i]['end'], j)
+                prog.next()
+          finally:
+            cache.put(key, spans.entries)
+
+    # collect the results and put them into self.segments
+    for i in range(len(self.segments)):
+      self.use_transcript(i, json.loads(self.fetch('segment_transcript', i)))
+
+  def use_transcript(self, i: int, j: dict) -> None:
+    """Put a {'language', 'text'} transcript into segment i"""
+    self.segments[i]['transcript'] = j['text']
+    self.segments[i]['language'] = j['language']
+
+  def transcriber(self) -> Transcriber:
+    """Whisper, set up the way the command line asks"""
+    return Transcriber(
+      self.models.load('transcribe'),
+      getattr(self.args, 'batch_size', 16),
+      getattr(self.args, 'combine', False)
+    )
+
+  def transcribe_segments(self, transcriber: Transcriber, todo: list[int]) -> Iterator[tuple[int, dict]]:
+    """Transcribe each segment on its own, a batch at a time"""
+    for start in range(0, len(todo), transcriber.batch_size):
+      batch = todo[start:start + transcriber.batch_size]
+      yield from zip(batch, transcriber.transcribe([self.samples(i) for i in batch]))
+
+  def transcribe_pool(self, todo: list[int]) -> Iterator[tuple[int, dict]]:
+    """Transcribe each segment on its own, spread over --workers processes"""
+    pool = TranscriptionPool(self.args, self.args.workers)
+    self.logger.info(f"Using {pool.workers} workers of {pool.threads} threads")
+    spans = {i: (self.segments[i]['start'], self.segments[i]['end']) for i in todo}
+    yield from pool.transcribe(self.paths.path('pcm'), spans)
+
+  def transcribe_whole(self, transcriber: Transcriber, todo: list[int]) -> Iterator[tuple[int, dict]]:
+    """Transcribe the whole recording in one go, then split it up by speaker turn"""
+    results = transcriber.transcribe_whole(
+      self.audio().samples,
+      [segment['start'] for segment in self.segments],
+      [segment['end'] for segment in self.segments]
+    )
+    for i in todo: yield i, results[i]
 
   def emotions(self) -> None:
     """Annotate the emotional valences of each segment"""
-    pass
\ No newline at end of file
+    todo = [i for i in range(len(self.segments)) if self.outdated('segment_emotions', i)]
+
+    if len(todo) > 0:
+      with self.logger.indent("Detecting emotions", True):
+        scorer = self.scorer()
+        start = time.time()
+        with self.storing() as save, self.logger.progress("Scoring", len(todo)) as prog:
+          # a few batches at a time, so the results are saved as they come
+          for k in range(0, len(todo), 4 * scorer.batch_size):
+            chunk = todo[k:k + 4 * scorer.batch_size]
+            for i, scores in zip(chunk, scorer.score([self.heard(i) for i in chunk])):
+              save('segment_emotions', i, json.dumps(scores).encode())
+              prog.next()
+        elapsed = time.time() - start
+        self.logger.info(f"Scored {len(todo):,} segments at {len(todo) / max(elapsed, 1e-9):,.1f} segments/sec")
+
+    # collect the results and put them into self.segments
+    for i in range(len(self.segments)):
+      self.use_emotions(i, json.loads(self.fetch('segment_emotions', i)))
+
+  def use_emotions(self, i: int, scores: list[int]) -> None:
+    """Put the seven Ekman scores into segment i"""
+    self.segments[i]['emotions'] = scores
+    self.segments[i]['emotion'] = scores.index(max(scores))
+
+  def scorer(self) -> Scorer:
+    """The emotion model, set up the way the command line asks"""
+    source = self.models.emotion_source
+    return SCORERS[source](
+      self.models.load('emotions'),
+      self.models.processor('emotions'),
+      getattr(self.args, 'emotion_batch_size', None) or BATCH_SIZE[source]
+    )
+
+  def heard(self, i: int):
+    """What the emotion model gets of segment i - its samples, or its transcript"""
+    if self.models.emotion_source == 'text': return self.segments[i]['transcript']
+    return self.samples(i)
+
+  def stream(self) -> None:
+    """
+      detect(), extract(), transcribe() and emotions() all at the same time
+
+      Each segment moves on to be extracted, transcribed and scored as soon as
+      diarization finds it, so with windowed diarization the first transcripts
+      are ready long before the last speakers are found, and it all takes
+      about as long as the slowest step.
+    """
+    if getattr(self.args, 'engine', 'segments') != 'segments' or getattr(self.args, 'workers', 1) > 1:
+      self.logger.warning("Streaming transcribes each segment as it comes, in this process - ignoring --engine and --workers")
+
+    # a finished detect() has all the segments ready to go
+    found = not self.outdated('detect')
+    if found: self.detect()
+    source = range(len(self.segments)) if found else self.finding()
+
+    with self.logger.indent("Streaming segments", True), self.storing() as store:
+      # the stages save from threads of their own
+      lock = threading.Lock()
+      def save(name: str, i: int, data: bytes) -> None:
+        with lock: store(name, i, data)
+
+      start = time.time()
+      count = 0
+      for _ in stream(source, lambda inbox: self.extracting(inbox, save), lambda inbox: self.transcribing(inbox, save), lambda inbox: self.scoring(inbox, save)):
+        if count == 0: self.logger.info(f"First segment done in {format_elapsed_time(time.time() - start)}")
+        count += 1
+      self.logger.info(f"{count:,} segments done in {format_elapsed_time(time.time() - start)}")
+
+    # save the speakers just as detect() would have
+    if not found: self.save_speakers()
+
+  def finding(self) -> Iterator[int]:
+    """Find the segments, yielding the number of each one as soon as it is finished"""
+    self.segments = []
+    for segment in self.merging(self.turns(), self.max_gap()):
+      self.segments.append(segment)
+      yield segment['segment']
+
+  def extracting(self, inbox: Inbox, save) -> Iterator[int]:
+    """The extract() stage of stream()"""
+    for i in inbox:
+      self.segments[i]['path_audio'] = self.paths.rel('segment_audio', i)
+      if self.outdated('segment_audio', i): save('segment_audio', i, self.encode_clip(i))
+      yield i
+
+  def transcribing(self, inbox: Inbox, save) -> Iterator[int]:
+    """The transcribe() stage of stream(), a batch of whatever segments are ready at a time"""
+    transcriber = None
+    cache, key, spans = self.spans()
+    try:
+      for batch in inbox.batches(max(1, getattr(self.args, 'batch_size', 16))):
+        outdated = [i for i in batch if self.outdated('segment_transcript', i)]
+        done = {}
+        # earlier transcripts of the same audio first, then whisper for the rest
+        for i in outdated:
+          j = spans.find(self.segments[i]['start'], self.segments[i]['end'])
+          if j is not None: done[i] = j
+        todo = [i for i in outdated if i not in done]
+        # whisper is only loaded once there is something for it to do
+        if len(todo) > 0 and transcriber is None: transcriber = self.transcriber()
+        for i, j in zip(todo, transcriber.transcribe([self.samples(i) for i in todo]) if todo else []):
+          spans.add(self.segments[i]['start'], self.segments[i]['end'], j)
+          done[i] = j
+        for i in batch:
+          self.segments[i]['path_transcript'] = self.paths.rel('segment_transcript', i)
+          if i in done:
+            save('segment_transcript', i, json.dumps(done[i]).encode())
+            self.use_transcript(i, done[i])
+          else:
+            self.use_transcript(i, json.loads(self.fetch('segment_transcript', i)))
+          yield i
+    finally:
+      cache.put(key, spans.entries)
+
+  def scoring(self, inbox: Inbox, save) -> Iterator[int]:
+    """The emotions() stage of stream(), a batch of whatever segments are ready at a time"""
+    scorer = None
+    size = getattr(self.args, 'emotion_batch_size', None) or BATCH_SIZE[self.models.emotion_source]
+    for batch in inbox.batches(max(1, size)):
+      todo = [i for i in batch if self.outdated('segment_emotions', i)]
+      # the model is only loaded once there is something for it to do
+      if len(todo) > 0 and scorer is None: scorer = self.scorer()
+      done = dict(zip(todo, scorer.score([self.heard(i) for i in todo]) if todo else []))
+      for i in batch:
+        if i in done:
+          save('segment_emotions', i, json.dumps(done[i]).encode())
+          self.use_emotions(i, done[i])
+        else:
+          self.use_emotions(i, json.loads(self.fetch('segment_emotions', i)))
+        yield i
@@ -0,0 +1,121 @@
+import argparse, logging, os, traceback
+from multiprocessing.connection import Listener, Client as Connect
+
+from ege.logging import setup_logging
+
+"""
+  A resident worker that keeps the models warm between files
+
+  Importing pyannote and loading the diarization, whisper and emotion models
+  costs more than processing a short recording does. The server pays for that
+  once, then runs jobs sent to it over a unix socket, one at a time, relaying
+  its log back to whoever sent the job.
+
+    ./bin/server                        # leave this running
+    ./bin/scribinator --server a.m4a    # send jobs to it
+
+  Nothing heavy is imported at module level, so the client side starts fast.
+"""
+
+
+class Relay(logging.Handler):
+  """Send log records back to the client that sent the job"""
+
+  def __init__(self, conn) -> None:
+    super().__init__()
+    self.conn = conn
+
+  def emit(self, record: logging.LogRecord) -> None:
+    try:
+      self.conn.send(('log', (record.levelno, getattr(record, 'indent_level', 0), record.getMessage())))
+    except (OSError, EOFError):
+      # the client went away, but the job can still finish
+      pass
+
+
+class Server:
+  def __init__(self, args: 'argparse.Namespace') -> None:
+    """Set up a server listening on args.socket"""
+    from .models import Models
+
+    self.args = args
+    self.address = args.socket
+    self.logger = setup_logging()
+    self.models = Models(args)
+
+  def warm(self) -> None:
+    """Import the libraries and load every model up front"""
+    with self.logger.indent("Warming models", True):
+      # pulls in torch, pydub and the rest of the pipeline
+      from .scribinator import Scribinator
+      for name in self.models.names():
+        self.models.load(name)
+
+  def run(self) -> None:
+    """Serve jobs until interrupted"""
+    self.warm()
+    if os.path.exists(self.address): os.unlink(self.address)
+    try:
+      with Listener(self.address, family='AF_UNIX') as listener:
+        os.chmod(self.address, 0o600)
+        self.logger.info(f"Listening on {self.address}")
+        while True:
+          with listener.accept() as conn:
+            self.handle(conn)
+    except KeyboardInterrupt:
+      self.logger.info("Shutting down")
+    finally:
+      if os.path.exists(self.address): os.unlink(self.address)
+
+  def handle(self, conn) -> None:
+    """Run a single job, relaying the log to the client"""
+    from .scribinator import Scribinator
+
+    path, options = conn.recv()
+    args = argparse.Namespace(**{**vars(self.args), **options})
+    relay = Relay(conn)
+    self.logger.addHandler(relay)
+    try:
+      Scribinator(args, path).run()
+      conn.send(('done', None))
+    except Exception:
+      self.logger.error(traceback.format_exc())
+      conn.send(('error', traceback.format_exc()))
+    finally:
+      self.logger.removeHandler(relay)
+
+
+class Client:
+  def __init__(self, args: 'argparse.Namespace') -> None:
+    """Set up a client for the server listening on args.socket"""
+    self.args = args
+    self.address = args.socket
+    self.logger = setup_logging()
+
+  def options(self) -> dict:
+    """The switches to send along with each job"""
+    return {k: v for k, v in vars(self.args).items() if k not in ['files', 'server', 'socket']}
+
+  def submit(self, path: str) -> bool:
+    """Send one file to the server and wait for it to finish"""
+    try:
+      conn = Connect(self.address, family='AF_UNIX')
+    except (FileNotFoundError, ConnectionRefusedError):
+      self.logger.critical(f"No server on {self.address} - start one with ./bin/server")
+      return False
+
+    with conn:
+      conn.send((os.path.abspath(path), self.options()))
+      while True:
+        kind, payload = conn.recv()
+        if kind == 'log':
+          # replay it through our own logger so it reads like a local run
+          level, indent, message = payload
+          base, self.logger.indent_level = self.logger.indent_level, indent
+          self.logger.log(level, message)
+          self.logger.indent_level = base
+        elif kind == 'error':
+          self.logger.error(f"{path} failed on the server")
+          return False
+        else:
+          return True
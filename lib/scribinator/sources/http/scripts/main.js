@@ -81,6 +81,10 @@ function populateTranscript() {
     // fetch the highestEmotion's full name using the emotion index
     let highestEmotion = emotionsFull[segment.emotion];
 
+    // packed clips start out as a slice of the whole recording, until the real clip is loaded
+    let audioSource = segment.pack_audio ? `all.mp3#t=${segment.start},${segment.end}` : segment.path_audio;
+    let audioType = segment.pack_audio ? 'audio/mpeg' : 'audio/wav';
+
     let allEmotions = segment.emotions.map((emotion, idx) => {
       return `<span class="tooltip-container">${emotionsShort[idx]}<span class="tooltip-text" data-tooltip="${emotionsFull[idx]}"></span></span>` + emotion;
     }).join(", ");
@@ -93,7 +97,7 @@ function populateTranscript() {
                                                 <strong>${speakerName}</strong> @ ${timeStamp} | <b>${highestEmotion}</b> [${allEmotions}]    
                                             </div> 
                                             <div class="indent">
-                                                <audio controls><source src="${segment.path_audio}" type="audio/mp3"></audio>
+                                                <audio controls id="audio-${segment.segment}" src="${audioSource}" type="${audioType}"></audio>
                                             </div>  
                                         </div>
                                         <div class="indent">
@@ -124,6 +128,9 @@ function populateTranscript() {
         textarea.addEventListener('change', update_results);
         autoResizeTextarea(textarea);
       }
+      if (segment.pack_audio) {
+        loadPackedAudio(segment);
+      }
     });
 
 
@@ -133,6 +140,27 @@ function populateTranscript() {
 }
 
 
+// point a segment's player at its clip inside segments.pack, fetched as a byte range
+function loadPackedAudio(segment) {
+  let [offset, length] = segment.pack_audio;
+  fetch('segments.pack', {headers: {Range: `bytes=${offset}-${offset + length - 1}`}})
+    .then((response) => {
+      // a 200 means the whole pack came back, i.e. no range support (like file://)
+      if (response.status !== 206) throw new Error('no range support');
+      return response.blob();
+    })
+    .then((blob) => {
+      let audio = document.getElementById(`audio-${segment.segment}`);
+      if (audio) {
+        audio.src = URL.createObjectURL(new Blob([blob], {type: 'audio/wav'}));
+      }
+    })
+    .catch(() => {
+      // keep playing the slice of all.mp3
+    });
+}
+
+
 document.addEventListener("DOMContentLoaded", function() {
   // pretty-print the original results in the debug text area
   let prettyPrinted = JSON.stringify(document.transcriptionator.results, null, 2);
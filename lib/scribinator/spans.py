@@ -0,0 +1,80 @@
+"""
+  Earlier transcripts of a recording, found by the stretch of audio they cover
+
+  Re-running diarization (a new model, other speaker-count hints) moves the
+  segment boundaries a little and renumbers the segments, so results kept by
+  segment number are no use. Kept by span instead, a segment that covers
+  about the same audio as before just gets its old transcript back.
+
+  Where whisper gave word timestamps (--combine and --engine whole), a span
+  that is new but lies in audio already transcribed is put together from the
+  words said in it, so only audio nobody has listened to yet goes to whisper.
+"""
+
+TOLERANCE = 0.25          # seconds a boundary can move and still be the same span
+
+
+class Spans:
+  """{'start', 'end', 'language', 'text', 'words'} transcripts, words timed on the whole recording"""
+
+  def __init__(self, entries: list[dict] = None, tolerance: float = TOLERANCE) -> None:
+    self.entries = list(entries or [])
+    self.tolerance = tolerance
+
+  def add(self, start: float, end: float, result: dict) -> None:
+    """Keep the transcript of [start, end), with any words timed from start"""
+    words = result.get('words')
+    if words is not None:
+      words = [{'word': w['word'], 'start': w['start'] + start, 'end': w['end'] + start} for w in words]
+    # a newer transcript of the same span replaces the old one
+    self.entries = [e for e in self.entries if not self.same(e, start, end)]
+    self.entries.append({'start': start, 'end': end, 'language': result['language'], 'text': result['text'], 'words': words})
+
+  def same(self, entry: dict, start: float, end: float) -> bool:
+    return abs(entry['start'] - start) <= self.tolerance and abs(entry['end'] - end) <= self.tolerance
+
+  def find(self, start: float, end: float) -> dict:
+    """A {'language', 'text', 'words'} for [start, end) from what we already have, or None if it needs whisper"""
+    same = [e for e in self.entries if self.same(e, start, end)]
+    if len(same) > 0:
+      e = min(same, key=lambda e: abs(e['start'] - start) + abs(e['end'] - end))
+      return self.result(e['language'], e['text'], e['words'], start)
+
+    # every bit of the span has to have been heard, with the words kept
+    overlapping = [e for e in self.entries if e['end'] > start and e['start'] < end]
+    if len(overlapping) == 0 or any(e['words'] is None for e in overlapping): return None
+    if end - start - self.covered(overlapping, start, end) > self.tolerance: return None
+
+    # the words said in the span, by where their middle is - where earlier
+    # diarizations overlap, only the newest one's words count, so none come twice
+    words = []
+    claimed = []
+    for e in reversed(overlapping):
+      for w in e['words']:
+        middle = (w['start'] + w['end']) / 2
+        if start <= middle < end and e['start'] <= middle < e['end'] and not any(s <= middle < t for s, t in claimed):
+          words.append(w)
+      claimed.append((e['start'], e['end']))
+    words.sort(key=lambda w: w['start'])
+    languages = [e['language'] for e in overlapping]
+    language = max(set(languages), key=languages.count)
+    return self.result(language, ''.join(w['word'] for w in words), words, start)
+
+  @staticmethod
+  def covered(entries: list[dict], start: float, end: float) -> float:
+    """How much of [start, end) the entries cover between them, counting overlaps once"""
+    ret = 0.0
+    reach = start
+    for s, e in sorted((max(e['start'], start), min(e['end'], end)) for e in entries):
+      if e > reach:
+        ret += e - max(s, reach)
+        reach = e
+    return ret
+
+  @staticmethod
+  def result(language: str, text: str, words: list[dict], start: float) -> dict:
+    """A transcript as the Transcriber gives it, with the words timed from start"""
+    ret = {'language': language, 'text': text}
+    if words is not None:
+      ret['words'] = [{'word': w['word'], 'start': w['start'] - start, 'end': w['end'] - start} for w in words]
+    return ret
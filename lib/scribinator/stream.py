@@ -0,0 +1,107 @@
+import queue, threading
+from typing import Callable, Iterable, Iterator
+
+"""
+  Stages that run at the same time, joined by bounded queues
+
+  Each stage runs in its own thread, taking items from the stage before it
+  as soon as they are ready and handing its own on to the next. So the
+  first items come out the far end long before the first stage is done,
+  and the whole thing takes about as long as the slowest stage rather than
+  all of them added up. The queues are bounded, so a fast stage waits for a
+  slow one instead of piling up work in memory.
+
+  The heavy lifting (torch, onnxruntime, numpy, file io) lets go of the GIL,
+  so threads are enough to keep several stages busy at once.
+
+  If any stage fails, the others are stopped and the error comes out the far
+  end, just as if the stages had been run one after the other.
+"""
+
+# marks the end of the items in a queue
+DONE = object()
+
+
+class Failed:
+  """An error on its way downstream, in place of an item"""
+  def __init__(self, error: BaseException) -> None:
+    self.error = error
+
+
+class Inbox:
+  """The items coming in to a stage, one at a time or in batches of whatever is ready"""
+
+  def __init__(self, q: queue.Queue, stop: threading.Event) -> None:
+    self.q = q
+    self.stop = stop
+    self.done = False
+
+  def get(self, block: bool = True):
+    """The next item, DONE at the end, or (when not blocking) None if nothing is ready yet"""
+    while not self.done and not self.stop.is_set():
+      try:
+        item = self.q.get(timeout=0.1) if block else self.q.get_nowait()
+      except queue.Empty:
+        if block: continue
+        return None
+      if isinstance(item, Failed): raise item.error
+      if item is DONE: self.done = True
+      return item
+    return DONE
+
+  def __iter__(self) -> Iterator:
+    while (item := self.get()) is not DONE:
+      yield item
+
+  def batches(self, size: int) -> Iterator[list]:
+    """
+      Batches of up to size items
+
+      Waits for the first item of each batch, then takes whatever else is
+      already waiting, so nothing sits waiting for a batch to fill up.
+    """
+    while (item := self.get()) is not DONE:
+      batch = [item]
+      while len(batch) < size and (item := self.get(False)) not in (None, DONE):
+        batch.append(item)
+      yield batch
+
+
+def stream(source: Iterable, *stages: Callable[[Inbox], Iterable], size: int = 16) -> Iterator:
+  """
+    Run the source and each stage in threads of their own, yielding what comes out of the last stage
+
+    Each stage is a function that takes an Inbox of the items from the one
+    before it and yields the items for the next one.
+  """
+  stop = threading.Event()
+  queues = [queue.Queue(size) for _ in range(len(stages) + 1)]
+
+  def put(q: queue.Queue, item) -> bool:
+    while not stop.is_set():
+      try:
+        q.put(item, timeout=0.1)
+        return True
+      except queue.Full:
+        pass
+    return False
+
+  def feed(items: Callable[[], Iterable], q: queue.Queue) -> None:
+    try:
+      for item in items():
+        if not put(q, item): return
+      put(q, DONE)
+    except BaseException as e:
+      put(q, Failed(e))
+
+  threads = [threading.Thread(target=feed, args=(lambda: source, queues[0]), daemon=True)]
+  for k, stage in enumerate(stages):
+    inbox = Inbox(queues[k], stop)
+    threads.append(threading.Thread(target=feed, args=(lambda stage=stage, inbox=inbox: stage(inbox), queues[k + 1]), daemon=True))
+
+  for thread in threads: thread.start()
+  try:
+    yield from Inbox(queues[-1], stop)
+  finally:
+    stop.set()
+    for thread in threads: thread.join()
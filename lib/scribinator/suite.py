@@ -0,0 +1,278 @@
+import argparse, datetime, json, os, platform, shutil, subprocess, sys, tempfile, time, wave
+
+import numpy as np
+
+from ege.logging import setup_logging
+
+"""
+  How long each step takes, and whether that got worse
+
+  The suite runs the pipeline on a synthetic recording: speakers taking
+  turns, each a tone of their own with a little noise, with silence at
+  known boundaries between turns. The neural networks are swapped for
+  stand-ins that take next to no time, so it runs offline in seconds and
+  what it measures is our own code - making the project, merging turns,
+  cutting clips, handing segments to the transcriber, writing cache.js, and
+  the whole run end to end.
+
+  Each step is run a few times and the best time kept, which is the least
+  noisy number. Saved as a baseline, a later run fails if any step got
+  slower than the tolerance allows.
+
+  Two steps run in a fresh python, the way the command line does: startup
+  (just importing the pipeline) and rerender (a whole run of a project
+  whose results are all there already). Those have a budget of their own,
+  baseline or not - nothing that has already been done should pay for
+  loading torch and friends.
+"""
+
+SAMPLE_RATE = 16000
+TOLERANCE = 20            # percent a step can slow down before it counts as a regression
+SLACK = 0.005             # seconds - differences smaller than this are timer noise, whatever the percentage
+STAGES = ['project', 'merge', 'extract', 'transcribe', 'cache_js', 'run', 'startup', 'rerender']
+BUDGET = 0.5              # seconds a fully cached re-render may take, python startup and imports included
+
+# libraries that take seconds to import, and only belong inside the steps that use them
+HEAVY = ['torch', 'torchaudio', 'transformers', 'whisper', 'pyannote', 'pydub', 'onnxruntime', 'faiss', 'speechbrain']
+
+# a whole run of a project, in a python of its own
+RERENDER = """
+import argparse, json, sys
+from scribinator.scribinator import Scribinator
+Scribinator(argparse.Namespace(**json.loads(sys.argv[1])), sys.argv[2]).run()
+"""
+
+# what the command line would have set, for everything the suite does not ask about
+DEFAULTS = {
+  'reset': False, 'reset_stage': [], 'pack': False, 'stream': False, 'open': False,
+  'engine': 'segments', 'workers': 1, 'combine': False, 'batch_size': 16,
+  'emotion_source': 'audio', 'emotion_batch_size': None,
+  'window': 0, 'overlap': 30, 'vad': False, 'precision': 'fp32', 'backend': 'torch',
+  'title': None, 'description': None, 'location': None, 'when': None, 'author': None,
+}
+
+
+def synthetic(path: str, speakers: int = 3, turns: int = 60, seed: int = 0) -> list[tuple[float, float, int]]:
+  """
+    Write a wav of speakers taking turns, returning the (start, end, speaker) of each turn
+
+    Each speaker is a tone a few semitones from the others with a little
+    noise on it, and there is silence between turns - so the boundaries are
+    known exactly.
+  """
+  rng = np.random.default_rng(seed)
+  pitches = [220 * 2 ** (4 * k / 12) for k in range(speakers)]
+  pieces = []
+  ret = []
+  t = 0
+  speaker = 0
+  for _ in range(turns):
+    silence = int(rng.uniform(0.2, 1.0) * SAMPLE_RATE)
+    length = int(rng.uniform(0.5, 6.0) * SAMPLE_RATE)
+    pieces.append(np.zeros(silence, dtype=np.float32))
+    t += silence
+    phase = 2 * np.pi * pitches[speaker] * np.arange(length) / SAMPLE_RATE
+    pieces.append((0.3 * np.sin(phase) + 0.02 * rng.standard_normal(length)).astype(np.float32))
+    ret.append((t / SAMPLE_RATE, (t + length) / SAMPLE_RATE, speaker))
+    t += length
+    # somebody else speaks next
+    speaker = (speaker + int(rng.integers(1, speakers))) % speakers if speakers > 1 else 0
+  pieces.append(np.zeros(SAMPLE_RATE // 2, dtype=np.float32))
+
+  samples = np.concatenate(pieces)
+  with wave.open(path, 'wb') as w:
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(SAMPLE_RATE)
+    w.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+  return ret
+
+
+class EchoTranscriber:
+  """Stands in for whisper, hearing only how long each clip is"""
+  def __init__(self, batch_size: int = 16) -> None:
+    self.batch_size = batch_size
+
+  def transcribe(self, clips: list[np.ndarray]) -> list[dict]:
+    return [{'language': 'en', 'text': f' {len(clip) / SAMPLE_RATE:.2f} seconds'} for clip in clips]
+
+
+class LoudnessScorer:
+  """Stands in for the emotion model, scoring each clip as angry by how loud it is"""
+  batch_size = 16
+
+  def score(self, clips: list[np.ndarray]) -> list[list[int]]:
+    loudness = [float(np.sqrt(np.mean(np.square(clip)))) if len(clip) > 0 else 0.0 for clip in clips]
+    return [[0, 0, 0, 0, min(100, int(100 * rms)), 0, 0] for rms in loudness]
+
+
+def parse_importtime(report: str) -> dict[str, float]:
+  """{module: cumulative seconds} from what python -X importtime writes to stderr"""
+  ret = {}
+  for line in report.splitlines():
+    if not line.startswith('import time:'): continue
+    fields = [field.strip() for field in line[len('import time:'):].split('|')]
+    if len(fields) != 3 or not fields[1].isdigit(): continue
+    ret[fields[2]] = int(fields[1]) / 1e6
+  return ret
+
+
+def python(*argv: str, **kwargs) -> subprocess.CompletedProcess:
+  """Run a fresh python that can import scribinator"""
+  lib = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  path = os.pathsep.join(p for p in [lib, os.environ.get('PYTHONPATH')] if p)
+  return subprocess.run([sys.executable, *argv], env={**os.environ, 'PYTHONPATH': path}, capture_output=True, text=True, **kwargs)
+
+
+def import_times(module: str = 'scribinator.scribinator') -> dict[str, float]:
+  """{module: cumulative seconds} of everything importing module pulls in, in a fresh python"""
+  done = python('-X', 'importtime', '-c', f'import {module}')
+  if done.returncode != 0: raise RuntimeError(f"could not import {module}: {done.stderr.strip().splitlines()[-1:]}")
+  return parse_importtime(done.stderr)
+
+
+def heavy(times: dict[str, float]) -> list[str]:
+  """The heavy libraries among the imported modules"""
+  return sorted({name.split('.')[0] for name in times if name.split('.')[0] in HEAVY})
+
+
+def regressions(baseline: dict, results: dict, tolerance: float = TOLERANCE, slack: float = SLACK) -> dict:
+  """{stage: (baseline, now)} for each stage more than tolerance percent (and slack seconds) slower than its baseline"""
+  ret = {}
+  for stage, seconds in results.items():
+    before = baseline.get(stage)
+    if before is None: continue
+    if seconds > before * (1 + tolerance / 100) and seconds - before > slack: ret[stage] = (before, seconds)
+  return ret
+
+
+class Suite:
+  def __init__(self, args: 'argparse.Namespace', repeat: int = 3, speakers: int = 3, turns: int = 60) -> None:
+    self.args = args
+    self.logger = setup_logging()
+    self.repeat = max(1, repeat)
+    self.speakers = speakers
+    self.count = turns
+    self.dir = None
+    self.loaded = []
+
+  def namespace(self, **overrides) -> 'argparse.Namespace':
+    """Arguments for a run inside the suite's own folder, so nothing outside it is read or touched"""
+    return argparse.Namespace(**{
+      **DEFAULTS,
+      **vars(self.args),
+      'models': os.path.join(self.dir, 'models'),
+      'cache': os.path.join(self.dir, 'cache'),
+      'library': os.path.join(self.dir, 'library'),
+      'open': False,
+      **overrides,
+    })
+
+  def scribinator(self, **overrides) -> 'Scribinator':
+    """A Scribinator on the synthetic recording, with the stand-ins in place of the models"""
+    from .scribinator import Scribinator
+    s = Scribinator(self.namespace(**overrides), self.path)
+    s.segments.turns = lambda: iter(self.turns)
+    s.segments.transcriber = lambda: EchoTranscriber(getattr(s.args, 'batch_size', 16))
+    s.segments.scorer = LoudnessScorer
+    return s
+
+  def measure(self, name: str, work, setup=None) -> float:
+    """The best wall time of work(setup()) over the repeats - setup is not timed"""
+    best = None
+    for _ in range(self.repeat):
+      state = setup() if setup is not None else None
+      start = time.perf_counter()
+      work(state)
+      elapsed = time.perf_counter() - start
+      best = elapsed if best is None else min(best, elapsed)
+    self.logger.info(f"{name:<12} {best * 1000:,.1f} ms")
+    return best
+
+  def run(self, stages: list[str] = None) -> dict:
+    """{stage: seconds} for each stage of the pipeline on a synthetic recording"""
+    from .project import Project
+    from .segments import Segments
+
+    ret = {}
+    with tempfile.TemporaryDirectory() as self.dir:
+      self.path = os.path.join(self.dir, 'synthetic.wav')
+      self.turns = synthetic(self.path, self.speakers, self.count)
+      root = os.path.splitext(self.path)[0]
+      # lots of short turns, many by the same speaker in a row, for merging
+      rng = np.random.default_rng(1)
+      many = [(k * 0.5, k * 0.5 + 0.4, int(s)) for k, s in enumerate(rng.integers(0, self.speakers, 20000))]
+
+      def fresh() -> None:
+        if os.path.exists(root): shutil.rmtree(root)
+
+      def prepared(*steps, **overrides):
+        def setup():
+          s = self.scribinator(**overrides)
+          for step in steps: getattr(s.segments, step)()
+          return s
+        return setup
+
+      def rendered() -> list[str]:
+        # everything done once with the stand-ins, so the real run has nothing left to do
+        self.scribinator().run()
+        return ['-c', RERENDER, json.dumps(vars(self.namespace())), self.path]
+
+      measures = {
+        'project': lambda: self.measure('project', lambda _: Project(self.namespace(), self.path), lambda: fresh()),
+        'merge': lambda: self.measure('merge', lambda _: Segments.merge(many, 0.2)),
+        'extract': lambda: self.measure('extract', lambda s: s.segments.extract(), prepared('detect', reset_stage=['extract'])),
+        'transcribe': lambda: self.measure('transcribe', lambda s: s.segments.transcribe(), prepared('detect', reset_stage=['transcribe'])),
+        'cache_js': lambda: self.measure('cache_js', lambda s: s.cache_file(), prepared('detect', 'extract', 'transcribe', 'emotions')),
+        'run': lambda: self.measure('run', lambda s: s.run(), lambda: self.scribinator(reset=True)),
+        'startup': lambda: self.measure('startup', lambda _: self.python('-c', 'import scribinator.scribinator')),
+        'rerender': lambda: self.measure('rerender', lambda argv: self.python(*argv), rendered),
+      }
+      with self.logger.indent(f"Timing {len(self.turns)} turns by {self.speakers} speakers, best of {self.repeat}", True):
+        for stage in stages or STAGES:
+          ret[stage] = measures[stage]()
+        # what a cached run imports, once more outside the clock
+        if 'rerender' in ret: self.loaded = heavy(parse_importtime(self.python('-X', 'importtime', *rendered()).stderr))
+    return ret
+
+  def python(self, *argv: str) -> subprocess.CompletedProcess:
+    """A fresh python, which has to succeed"""
+    done = python(*argv)
+    if done.returncode != 0: raise RuntimeError(f"python {' '.join(argv[:2])} failed: {done.stderr.strip()[-500:]}")
+    return done
+
+  def budget(self, results: dict) -> list[str]:
+    """What is wrong with starting up - a cached re-render over BUDGET, or heavy libraries it had no need for"""
+    ret = []
+    if results.get('rerender', 0) > BUDGET:
+      ret.append(f"a cached re-render took {results['rerender']:.2f}s, over the {BUDGET:g}s budget")
+    if self.loaded:
+      ret.append(f"a cached re-render imported {', '.join(self.loaded)}")
+    for problem in ret: self.logger.error(problem)
+    return ret
+
+  @staticmethod
+  def save(path: str, results: dict) -> None:
+    """Keep the results as the baseline later runs are held to"""
+    if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+      json.dump({
+        'stages': results,
+        'machine': platform.node(),
+        'python': sys.version.split()[0],
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+      }, f, indent=1)
+
+  def check(self, path: str, results: dict, tolerance: float = TOLERANCE) -> dict:
+    """Hold the results to the baseline in path, logging and returning the regressions"""
+    with open(path, 'r') as f: baseline = json.load(f)
+    if baseline.get('machine') != platform.node():
+      self.logger.warning(f"The baseline was made on {baseline.get('machine')}, so the times may not compare")
+    ret = regressions(baseline['stages'], results, tolerance)
+    with self.logger.indent(f"Against the baseline of {baseline.get('date')}"):
+      for stage, seconds in results.items():
+        before = baseline['stages'].get(stage)
+        if before is None: continue
+        flag = '  REGRESSION' if stage in ret else ''
+        self.logger.info(f"{stage:<12} {before * 1000:,.1f} ms -> {seconds * 1000:,.1f} ms ({seconds / max(before, 1e-9) - 1:+.0%}){flag}")
+    return ret
@@ -0,0 +1,196 @@
+import warnings
+
+import numpy as np
+
+"""
+  Whisper over many segments at once
+
+  model.transcribe() handles one clip per call: it pads the clip out to a
+  30 second window and runs the encoder on a batch of one. Most segments are
+  far shorter than that, so here the samples come straight from memory, the
+  log-mel spectrograms of a whole batch are computed in one go, and the
+  encoder and decoder run over the batch together.
+
+  Anything the single-pass decode cannot do justice to - clips longer than a
+  window, or ones whisper would retry at a higher temperature - goes through
+  model.transcribe() as before, so the results are the same.
+
+  Conversation is mostly short turns ("yeah", "right, okay"), and a two
+  second clip in a thirty second window is mostly padding. With combine on,
+  runs of neighbouring short clips are laid end to end, with a little
+  silence between them, into windows that are nearly full. Each window is
+  transcribed once with word timestamps, and every word goes back to the
+  clip it was said in.
+
+  Or whisper can hear the whole recording in one go, the way it was meant
+  to, keeping its context across turns. The words are then handed to the
+  speaker turns they overlap.
+"""
+
+SAMPLE_RATE = 16000
+WINDOW = 30               # seconds of audio whisper looks at in one pass
+
+# the same thresholds model.transcribe() uses to decide a pass went wrong
+COMPRESSION_RATIO = 2.4
+LOGPROB = -1.0
+NO_SPEECH = 0.6
+
+GAP = 0.5                 # seconds of silence between clips combined into one window
+
+
+def log_mel(batch: list[np.ndarray], n_mels: int = 80, device=None) -> 'torch.Tensor':
+  """
+    The (batch, n_mels, frames) log-mel spectrograms of one window of each clip
+
+    Exactly what model.transcribe() feeds the encoder for a clip of up to a
+    window: frames past the end of the clip are zero, and each clip is
+    normalized against its own loudest frame.
+  """
+  import torch
+  from whisper.audio import N_FFT, HOP_LENGTH, N_SAMPLES, N_FRAMES, mel_filters
+
+  audio = torch.zeros(len(batch), N_SAMPLES + N_FFT)
+  for i, samples in enumerate(batch):
+    samples = samples[:N_SAMPLES]
+    audio[i, :len(samples)] = torch.from_numpy(np.ascontiguousarray(samples, dtype=np.float32))
+  if device is not None: audio = audio.to(device)
+
+  window = torch.hann_window(N_FFT).to(audio.device)
+  stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=window, return_complex=True)
+  magnitudes = stft[..., :-1].abs() ** 2
+  log_spec = torch.clamp(mel_filters(audio.device, n_mels) @ magnitudes, min=1e-10).log10()
+  log_spec = torch.maximum(log_spec, log_spec.amax(dim=(1, 2), keepdim=True) - 8.0)
+  log_spec = ((log_spec + 4.0) / 4.0)[..., :N_FRAMES]
+
+  # model.transcribe() pads short clips out with zeros after normalizing
+  frames = torch.tensor([min(len(s), N_SAMPLES) // HOP_LENGTH for s in batch], device=audio.device)
+  return log_spec * (torch.arange(N_FRAMES, device=audio.device)[None, None, :] < frames[:, None, None])
+
+
+def combine(lengths: list[int], window: int = WINDOW * SAMPLE_RATE, gap: int = int(GAP * SAMPLE_RATE)) -> list[list[int]]:
+  """Group runs of neighbouring clips (by their lengths in samples) that fit in one window together with the gaps between them"""
+  ret = []
+  used = None
+  for i, length in enumerate(lengths):
+    if len(ret) > 0 and used + gap + length <= window:
+      ret[-1].append(i)
+      used += gap + length
+    else:
+      ret.append([i])
+      used = length
+  return ret
+
+
+def align_words(words: list[dict], starts: list[float], ends: list[float]) -> list[str]:
+  """
+    Share out timed words ({'word', 'start', 'end'}) to the spans [starts, ends)
+
+    Each word goes to the span it overlaps the most, or if it falls between
+    spans, to the nearest one.
+  """
+  return [''.join(word['word'] for word in span) for span in share_words(words, starts, ends)]
+
+
+def share_words(words: list[dict], starts: list[float], ends: list[float]) -> list[list[dict]]:
+  """The words of each span, as align_words() shares them out, timed from the start of their span"""
+  ret = [[] for _ in starts]
+  if len(starts) == 0: return ret
+  starts, ends = np.asarray(starts, dtype=float), np.asarray(ends, dtype=float)
+  for word in words:
+    overlap = np.minimum(ends, word['end']) - np.maximum(starts, word['start'])
+    k = np.argmax(overlap) if overlap.max() > 0 else np.argmin(np.maximum(starts - word['end'], word['start'] - ends))
+    ret[k].append({'word': word['word'], 'start': float(word['start'] - starts[k]), 'end': float(word['end'] - starts[k])})
+  return ret
+
+
+def timed_results(transcription: dict, starts: list[float], ends: list[float]) -> list[dict]:
+  """A {'language', 'text', 'words'} for each span of a word-timestamped whisper transcription"""
+  words = [word for segment in transcription['segments'] for word in segment.get('words', [])]
+  return [
+    {'language': transcription['language'], 'text': ''.join(word['word'] for word in span), 'words': span}
+    for span in share_words(words, starts, ends)
+  ]
+
+
+class Transcriber:
+  """Transcribe lists of mono 16 kHz clips into [{'language', 'text'}], batch_size clips at a time"""
+
+  def __init__(self, model, batch_size: int = 16, combine: bool = False) -> None:
+    self.model = model
+    self.batch_size = max(1, batch_size)
+    self.combine = combine
+
+  def transcribe(self, clips: list[np.ndarray]) -> list[dict]:
+    """A {'language', 'text'} for each clip, in the same order - and 'words', timed from the start of the clip, where whisper gave them"""
+    ret = [None] * len(clips)
+
+    # runs of short clips share a window; a clip on its own goes in a batch
+    if self.combine:
+      for group in combine([len(clip) for clip in clips]):
+        if len(group) < 2: continue
+        for i, result in zip(group, self.transcribe_window([clips[i] for i in group])):
+          ret[i] = result
+
+    short = [i for i, clip in enumerate(clips) if ret[i] is None and len(clip) <= WINDOW * SAMPLE_RATE]
+    for start in range(0, len(short), self.batch_size):
+      batch = short[start:start + self.batch_size]
+      for i, result in zip(batch, self.decode([clips[i] for i in batch])):
+        ret[i] = result
+    for i in range(len(clips)):
+      if ret[i] is None: ret[i] = self.transcribe_one(clips[i])
+    return ret
+
+  def decode(self, batch: list[np.ndarray]) -> list[dict]:
+    """One greedy pass over a batch of clips, each no longer than a window; None for any that need a retry"""
+    import torch, whisper
+
+    fp16 = self.model.device.type != 'cpu'
+    mel = log_mel(batch, self.model.dims.n_mels, self.model.device)
+    options = whisper.DecodingOptions(fp16=fp16)
+    tokenizer = whisper.tokenizer.get_tokenizer(
+      self.model.is_multilingual, num_languages=self.model.num_languages, task=options.task
+    )
+    with torch.no_grad():
+      results = whisper.decode(self.model, mel.half() if fp16 else mel, options)
+
+    ret = []
+    for result in results:
+      if result.no_speech_prob > NO_SPEECH and result.avg_logprob < LOGPROB:
+        # model.transcribe() drops windows it thinks are silence
+        ret.append({'language': result.language, 'text': ''})
+      elif result.compression_ratio > COMPRESSION_RATIO or result.avg_logprob < LOGPROB:
+        ret.append(None)
+      else:
+        # the same text model.transcribe() gives, leading space and all
+        ret.append({'language': result.language, 'text': tokenizer.decode(result.tokens)})
+    return ret
+
+  def transcribe_window(self, clips: list[np.ndarray]) -> list[dict]:
+    """Transcribe clips laid end to end in one window, and split the words back out"""
+    gap = np.zeros(int(GAP * SAMPLE_RATE), dtype=np.float32)
+    pieces, starts, ends = [], [], []
+    at = 0
+    for clip in clips:
+      if len(pieces) > 0:
+        pieces.append(gap)
+        at += len(gap)
+      pieces.append(np.asarray(clip, dtype=np.float32))
+      starts.append(at / SAMPLE_RATE)
+      at += len(clip)
+      ends.append(at / SAMPLE_RATE)
+
+    warnings.filterwarnings("ignore", category=UserWarning, message="FP16 is not supported on CPU; using FP32 instead")
+    transcription = self.model.transcribe(np.concatenate(pieces), word_timestamps=True, condition_on_previous_text=False)
+    return timed_results(transcription, starts, ends)
+
+  def transcribe_whole(self, samples: np.ndarray, starts: list[float], ends: list[float]) -> list[dict]:
+    """Transcribe a whole recording at once, and share the words out to the turns at [starts, ends) seconds"""
+    warnings.filterwarnings("ignore", category=UserWarning, message="FP16 is not supported on CPU; using FP32 instead")
+    transcription = self.model.transcribe(np.ascontiguousarray(samples, dtype=np.float32), word_timestamps=True)
+    return timed_results(transcription, starts, ends)
+
+  def transcribe_one(self, clip: np.ndarray) -> dict:
+    """The slow path - whisper's own sliding window with temperature fallback"""
+    warnings.filterwarnings("ignore", category=UserWarning, message="FP16 is not supported on CPU; using FP32 instead")
+    transcription = self.model.transcribe(np.ascontiguousarray(clip, dtype=np.float32))
+    return {'language': transcription['language'], 'text': transcription['text']}
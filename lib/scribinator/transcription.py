@@ -2,11 +2,10 @@ import json, os, warnings, shutil, datetime, subprocess, platform, functools
 from io import BytesIO
 from typing import Dict
 
-from pydub import AudioSegment
-import torch, torchaudio
-
 from ege.logging import setup_logging
 from ege.utils import format_elapsed_time, recursive_copy, remove_extension, greek_letters
+from .audio import Audio, decode
+from .diarization import diarize
 from .paths import Paths
 
 class Transcription:
@@ -54,6 +53,7 @@ class Transcription:
       'segments': os.path.join(r, "segments"),
       'info': os.path.join(r, "info.json"),
       'audio': os.path.join(r, "segments", "all.mp3"),
+      'pcm': os.path.join(r, "segments", "all.npy"),
       'json': os.path.join(r, "segments", "all.json"),
       'html': os.path.join(r, "index.html")
     }
@@ -62,8 +62,10 @@ class Transcription:
     """Get default or supplied meta information"""
 
     # first set up default values based on knowing nothing
+    # linux keeps no creation time, so the last change will have to do there
+    st = os.stat(self.paths.path('source'))
     dt = datetime.datetime.fromtimestamp(
-      os.stat(self.paths.path('source')).st_birthtime
+      getattr(st, 'st_birthtime', st.st_mtime)
     ).strftime('%Y-%m-%d %H:%M:%S')
     self.info = {
       'title': os.path.basename(self.paths.path('root')),
@@ -107,8 +109,12 @@ class Transcription:
     # then copy in the audio file
     if not os.path.exists(self.paths['audio']):
       with self.logger.timer("Copied audio file"):
+        from pydub import AudioSegment
         audio = AudioSegment.from_file(self.paths['source'])
         audio.export(self.paths['audio'], format="mp3")
+    if not os.path.exists(self.paths['pcm']):
+      with self.logger.timer("Decoded audio file"):
+        decode(self.paths['source'], self.paths['pcm'])
 
   def detect_segments(self):
     # if we've already done the hard work of finding the segments,
@@ -124,6 +130,7 @@ class Transcription:
       # these libraries are slow to load (like 8 or 9 seconds!)
       # so I only load them as needed
       with self.logger.timer("Loaded libraries"):
+        import torch
         from pyannote.audio import Pipeline
 
       # use graphics acceleration if possible
@@ -141,36 +148,36 @@ class Transcription:
         pipeline.to(device)
 
       # Apply diarization to the audio file to get speakers
+      # Long recordings are diarized a window at a time so memory stays flat
       # I cannot set weights_only=True in torchaudio, so just supress this warning for now
       with self.logger.indent("Calling speakers", True):
         self.logger.info("NB: this may take a while for large files")
         warnings.filterwarnings(action='ignore', message='You are using `torch.load`')
-        waveform, sample_rate = torchaudio.load(self.paths['audio']) #, weights_only=True)
-        diarization = pipeline({
-          "waveform": waveform,
-          "sample_rate": sample_rate
-        })
-
-      # Merge contiguous speaker segments
-      segments = []
-      current_speaker = current_start = current_end = None
-      for turn, _, speaker in diarization.itertracks(yield_label=True):
-        if speaker != current_speaker:
-          if current_speaker is not None:
-            segments.append((current_start, current_end, current_speaker))
-          current_speaker = speaker
-          current_start = turn.start
-          current_end = turn.end
-        else:
-          current_end = turn.end
-      # Append the last segment
-      if current_speaker is not None:
-        segments.append((current_start, current_end, current_speaker))
+        turns = diarize(
+          pipeline, Audio(self.paths['pcm']),
+          window=getattr(self.args, 'window', 0),
+          overlap=getattr(self.args, 'overlap', 30)
+        )
+
+        # Merge contiguous speaker segments
+        segments = []
+        current_speaker = current_start = current_end = None
+        for start, end, speaker in turns:
+          if speaker != current_speaker:
+            if current_speaker is not None:
+              segments.append((current_start, current_end, current_speaker))
+            current_speaker = speaker
+            current_start = start
+            current_end = end
+          else:
+            current_end = end
+        # Append the last segment
+        if current_speaker is not None:
+          segments.append((current_start, current_end, current_speaker))
 
       # convert to a nice dict of all of this, and then save the json
       ret = []
       for i, (start, end, speaker) in enumerate(segments):
-        speaker = int(speaker.split('_')[1])
         ret.append({
           'segment':      i,
           'start':        start,
@@ -199,6 +206,7 @@ class Transcription:
 
     with self.logger.indent("Getting Segments", True):
       # buffer all the IO up front for faster saves
+      from pydub import AudioSegment
       audio = AudioSegment.from_mp3(self.paths['audio'])
       segment_buffers = []
 
@@ -288,6 +296,8 @@ class Transcription:
     return ret
 
   def _detect_emotions(self, wav_path: str, transcription: str, model, tokenizer, feature_extractor):
+    import torch, torchaudio
+
     # Load audio file
     waveform, sample_rate = torchaudio.load(wav_path)
 
@@ -0,0 +1,56 @@
+import json, os, tempfile
+
+from ege.logging import setup_logging, peak_rss
+
+def test_metrics():
+  logger = setup_logging()
+  with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'metrics.jsonl')
+    with logger.metrics(path, audio=10.0):
+      with logger.indent("Outer", True):
+        with logger.timer("Inner"):
+          sum(range(10000))
+        with logger.progress("Steps", 4) as prog:
+          for _ in range(4): prog.next()
+    # nothing outside the block is recorded
+    with logger.timer("Elsewhere"):
+      pass
+
+    with open(path) as f: records = [json.loads(line) for line in f]
+    assert [r['stage'] for r in records] == ['Inner', 'Steps', 'Outer', 'summary']
+    inner, steps, outer, summary = records
+    assert outer['depth'] == inner['depth'] - 1
+    assert steps['items'] == 4 and steps['items_per_sec'] > 0
+    assert inner['items'] is None and inner['items_per_sec'] is None
+    assert outer['rtf'] == round(outer['wall'] / 10.0, 4)
+    assert all(r['audio'] == 10.0 and r['run'] == summary['run'] for r in records)
+    assert summary['stages']['Steps']['items'] == 4
+    assert summary['wall'] >= outer['wall']
+
+def test_peak_rss():
+  rss = peak_rss()
+  assert rss is None or rss > 0
+
+def test_trace():
+  logger = setup_logging()
+  with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'trace.json')
+    trace = logger.tracing(path, fresh=True)
+    try:
+      assert logger.tracing(path) is trace
+      with logger.indent("Outer"):
+        with logger.span("Quiet", segments=3) as span:
+          span.items = 3
+    finally:
+      logger.sinks.remove(trace)
+      trace.file.close()
+
+    with open(path) as f: text = f.read()
+    assert text.startswith('[\n')
+    events = json.loads(text.rstrip().rstrip(',') + ']')
+    assert {e['name'] for e in events if e['ph'] == 'M'} == {'process_name', 'thread_name'}
+    quiet, outer = [e for e in events if e['ph'] == 'X']
+    assert quiet['name'] == 'Quiet' and outer['name'] == 'Outer'
+    assert quiet['args']['segments'] == 3 and quiet['args']['items'] == 3
+    assert outer['ts'] <= quiet['ts'] and quiet['ts'] + quiet['dur'] <= outer['ts'] + outer['dur'] + 1
+    assert quiet['pid'] == os.getpid()
@@ -4,7 +4,7 @@ from typing import List
 from shutil import copy2
 import tempfile
 
-from ege.utils import format_elapsed_time, recursive_copy, remove_extension, greek_letters, pp
+from ege.utils import atomic_write, format_elapsed_time, recursive_copy, remove_extension, greek_letters, pp
 
 def test_format_elapsed_time():
   assert format_elapsed_time(0) == "0s"
@@ -42,3 +42,19 @@ def test_greek_letters():
   assert greek_letters(0) == "alpha"
   assert greek_letters(1) == "beta"
   assert greek_letters(24) == "alpha1"
+
+def test_atomic_write():
+  with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'out.txt')
+    with atomic_write(path, 'w') as f:
+      f.write('half')
+      # nothing shows under the real name until the block is done
+      assert not os.path.exists(path)
+    with open(path) as f: assert f.read() == 'half'
+    # a failed write leaves what was there, and no temp file behind
+    with pytest.raises(RuntimeError):
+      with atomic_write(path, 'w') as f:
+        f.write('other')
+        raise RuntimeError('failed')
+    with open(path) as f: assert f.read() == 'half'
+    assert os.listdir(tmp) == ['out.txt']
@@ -0,0 +1,29 @@
+import os, tempfile
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from scribinator.audio import Audio, npy_header, SAMPLE_RATE
+
+def write(path, samples):
+  with open(path, 'wb') as f:
+    f.write(npy_header(len(samples)))
+    f.write(samples.astype('<f4').tobytes())
+
+def test_header():
+  assert len(npy_header(0)) == len(npy_header(10 ** 15)) == 128
+
+def test_audio():
+  with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'all.npy')
+    samples = np.linspace(-1, 1, 3 * SAMPLE_RATE, dtype=np.float32)
+    write(path, samples)
+
+    a = Audio(path)
+    assert a.duration == 3
+    assert np.array_equal(np.load(path), samples)
+    assert a.read(1, 2).shape == (1, SAMPLE_RATE)
+    assert np.array_equal(a.clip(1, 2), samples[SAMPLE_RATE:2 * SAMPLE_RATE])
+    # views of the file, not copies
+    assert isinstance(a.clip(1, 2), np.memmap)
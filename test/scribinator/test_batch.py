@@ -0,0 +1,49 @@
+import multiprocessing, os, sys, types
+from argparse import Namespace
+
+import pytest
+
+from scribinator.batch import Batch, limit_threads, worker_run
+
+
+class FakeScribinator:
+  """Processes a file by doing nothing, failing for any file called bad"""
+  def __init__(self, args, path):
+    self.path = path
+    self.project = types.SimpleNamespace(duration=lambda: 60.0)
+    # the pool never opens a browser tab per file
+    assert not args.open
+
+  def run(self):
+    if os.path.basename(self.path) == 'bad': raise RuntimeError(f"could not process {self.path}")
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+  """Stand-ins for the pipeline and for torch, which forked workers inherit too"""
+  threads = []
+  monkeypatch.setitem(sys.modules, 'scribinator.scribinator', types.SimpleNamespace(Scribinator=FakeScribinator))
+  monkeypatch.setitem(sys.modules, 'torch', types.SimpleNamespace(set_num_threads=threads.append))
+  for k in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']: monkeypatch.delenv(k, raising=False)
+  return threads
+
+
+def test_limit_threads(fakes):
+  limit_threads(3)
+  assert fakes == [3]
+  assert os.environ['OMP_NUM_THREADS'] == os.environ['MKL_NUM_THREADS'] == os.environ['OPENBLAS_NUM_THREADS'] == '3'
+
+
+def test_worker_run(fakes):
+  assert worker_run(Namespace(open=False, trace=None), 'good') == 60.0
+  with pytest.raises(RuntimeError):
+    worker_run(Namespace(open=False, trace=None), 'bad')
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason="the workers only see the stand-ins when forked")
+def test_batch(fakes):
+  batch = Batch(Namespace(jobs=2, verbosity=0, open=True, trace=None))
+  assert batch.threads == max(1, (os.cpu_count() or 1) // 2)
+  assert batch.run(['one', 'bad', 'two']) == ['bad']
+  # nothing fails when there is nothing to do
+  assert batch.run([]) == []
@@ -0,0 +1,21 @@
+import unittest
+
+from scribinator.benchmark import words, word_errors, word_error_rate
+
+class TestBenchmark(unittest.TestCase):
+  def test_words(self):
+    assert words(" Well, I don't KNOW.") == ['well', 'i', "don't", 'know']
+
+  def test_word_errors(self):
+    assert word_errors([], []) == 0
+    assert word_errors(['a', 'b', 'c'], ['a', 'b', 'c']) == 0
+    assert word_errors(['a', 'b', 'c'], ['a', 'c']) == 1
+    assert word_errors(['a', 'b'], ['x', 'a', 'y']) == 2
+    assert word_errors([], ['a', 'b']) == 2
+
+  def test_word_error_rate(self):
+    assert word_error_rate(['the cat sat', 'on the mat'], ['The cat sat.', 'on a mat']) == 1 / 6
+    assert word_error_rate([''], ['']) == 0
+
+if __name__ == "__main__":
+  unittest.main()
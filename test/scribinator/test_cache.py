@@ -0,0 +1,35 @@
+import os, time, argparse, tempfile
+
+from scribinator.cache import Cache
+
+def make(tmp, size=1):
+  return Cache(argparse.Namespace(cache=tmp, cache_size=size), 'detect')
+
+def test_key():
+  assert Cache.key('a', {'x': 1, 'y': 2}) == Cache.key('a', {'y': 2, 'x': 1})
+  assert Cache.key('a', {'x': 1}) != Cache.key('b', {'x': 1})
+
+def test_get_put():
+  with tempfile.TemporaryDirectory() as tmp:
+    c = make(tmp)
+    assert c.get('k') is None
+    c.put('k', [[0.5, 1.5, 0]])
+    assert c.get('k') == [[0.5, 1.5, 0]]
+    assert len(c.entries()) == 1
+    c.clear()
+    assert c.get('k') is None
+
+def test_lru():
+  with tempfile.TemporaryDirectory() as tmp:
+    c = make(tmp)
+    for k in 'abc':
+      c.put(k, 'x' * 100)
+    # make the order of use unambiguous: b, c, then a
+    for i, k in enumerate('bca'):
+      os.utime(c.path(k), (time.time() + i, time.time() + i))
+    assert [os.path.basename(e[0]) for e in c.entries()] == ['b.json', 'c.json', 'a.json']
+
+    # shrink to two entries - b was used longest ago, so it goes
+    assert c.prune(2 * c.entries()[0][1]) == 1
+    assert c.get('b') is None
+    assert c.get('a') is not None and c.get('c') is not None
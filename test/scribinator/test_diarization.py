@@ -0,0 +1,54 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from scribinator.diarization import plan_windows, Stitcher
+
+
+def test_plan_windows_short():
+  assert plan_windows(100, 0, 30) == [(0.0, 100, 0.0, 100)]
+  assert plan_windows(100, 600, 30) == [(0.0, 100, 0.0, 100)]
+
+def test_plan_windows_cores_tile():
+  windows = plan_windows(1000, 300, 20)
+  assert windows[0][0] == 0 and windows[0][2] == 0
+  assert windows[-1][1] == 1000 and windows[-1][3] == 1000
+  for (_, _, _, core_end), (_, _, core_start, _) in zip(windows, windows[1:]):
+    assert core_end == core_start
+  for start, end, core_start, core_end in windows:
+    assert start <= core_start < core_end <= end
+    assert end - start <= 300
+
+def test_plan_windows_bad_overlap():
+  with pytest.raises(ValueError):
+    plan_windows(1000, 300, 300)
+
+def test_stitcher():
+  s = Stitcher()
+  a, b, c = np.eye(3)
+  assert s.assign(np.array([a, b]), [10, 10]) == [0, 1]
+  # same speakers, other order, plus a newcomer
+  assert s.assign(np.array([b + 0.1 * c, c, a]), [5, 5, 5]) == [1, 2, 0]
+  # a speaker with no usable embedding is never matched
+  assert s.assign(np.array([[np.nan] * 3]), [1]) == [3]
+  # and has no voice print, rather than a zero one
+  voices = s.voices()
+  assert len(voices) == 4 and np.isnan(voices[3]).all()
+  assert not np.isnan(np.array(voices[:3])).any()
+
+def test_capture(tmp_path):
+  from types import SimpleNamespace
+  from scribinator.diarization import Capture
+  c = Capture()
+  c.windows = [(0.0, 10.0, 0.0, 10.0)]
+  hook = c.hook(0)
+  window = SimpleNamespace(start=0.0, duration=5.0, step=0.5)
+  hook('segmentation', SimpleNamespace(data=np.ones((3, 4, 2)), sliding_window=window))
+  hook('embeddings', np.zeros((1, 2, 8)), total=3, completed=1)
+  hook('embeddings', np.ones((3, 2, 8)))
+  c.save(str(tmp_path / 'speakers.npz'))
+  saved = np.load(tmp_path / 'speakers.npz')
+  assert saved['windows'].tolist() == [[0.0, 10.0, 0.0, 10.0]]
+  assert saved['0_segmentation'].shape == (3, 4, 2)
+  assert saved['0_segmentation_window'].tolist() == [0.0, 5.0, 0.5]
+  assert saved['0_embeddings'].sum() == 48
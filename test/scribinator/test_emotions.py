@@ -0,0 +1,58 @@
+import unittest
+from types import SimpleNamespace
+
+import pytest
+np = pytest.importorskip('numpy')
+
+from scribinator.emotions import EKMAN, SAMPLE_RATE, MAX_SECONDS, MIN_SECONDS, Scorer, TextScorer, clip, columns, ekman
+
+class FakeScorer(Scorer):
+  """Gives every clip the same probabilities, keeping track of the batches"""
+  def __init__(self, id2label, batch_size):
+    super().__init__(SimpleNamespace(config=SimpleNamespace(id2label=id2label)), None, batch_size)
+    self.batches = []
+
+  def forward(self, batch):
+    self.batches.append([len(c) for c in batch])
+    return [ekman(np.full(len(self.columns), 1 / len(self.columns)), self.columns) for _ in batch]
+
+class FakeTokenizer:
+  def __call__(self, texts, **kwargs):
+    return {'texts': texts}
+
+class TestEmotions(unittest.TestCase):
+  def test_columns(self):
+    labels = {0: 'angry', 1: 'calm', 2: 'disgust', 3: 'fearful', 4: 'happy', 5: 'neutral', 6: 'sad', 7: 'surprised'}
+    assert columns(labels) == [4, None, 2, 0, 5, None, 3, 6]
+    # transformers configs often have string keys
+    assert columns({'1': 'Joy', '0': 'neu'}) == [None, 5]
+
+  def test_ekman(self):
+    cols = [4, None, 5, 5]
+    assert ekman(np.array([0.2, 0.5, 0.1, 0.2]), cols) == [0, 0, 0, 0, 20, 30, 0]
+    assert len(ekman(np.zeros(4), cols)) == len(EKMAN)
+
+  def test_clip(self):
+    assert len(clip(np.ones(10))) == int(MIN_SECONDS * SAMPLE_RATE)
+    assert len(clip(np.ones(int(MAX_SECONDS * SAMPLE_RATE) + 5))) == int(MAX_SECONDS * SAMPLE_RATE)
+    assert clip(np.ones(5000, dtype=np.float64)).dtype == np.float32
+
+  def test_score(self):
+    scorer = FakeScorer({0: 'happy', 1: 'sad'}, 2)
+    lengths = [2000, 9000, 3000, 8000, 4000]
+    scores = scorer.score([np.zeros(n) for n in lengths])
+    assert scores == [[0, 0, 0, 50, 0, 50, 0]] * 5
+    # clips of about the same length go together, so there is little padding
+    assert scorer.batches == [[9000, 8000], [4000, 3000], [2000]]
+
+  def test_text(self):
+    scorer = TextScorer(SimpleNamespace(config=SimpleNamespace(id2label={0: 'anger', 1: 'joy'})), FakeTokenizer(), 256)
+    read = []
+    def run(inputs):
+      read.extend(inputs['texts'])
+      return [[0, 0, 0, 0, 100, 0, 0] for _ in inputs['texts']]
+    scorer.run = run
+    scores = scorer.score([' I am so cross ', '', None, 'hmm'])
+    # nobody reads what nobody said
+    assert read == ['I am so cross', 'hmm']
+    assert scores == [[0, 0, 0, 0, 100, 0, 0], [0] * 7, [0] * 7, [0, 0, 0, 0, 100, 0, 0]]
@@ -0,0 +1,44 @@
+import os, tempfile, unittest
+from argparse import Namespace
+
+import pytest
+np = pytest.importorskip('numpy')
+
+from scribinator.library import Library
+
+class TestLibrary(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.args = Namespace(library=self.dir.name)
+
+  def tearDown(self):
+    self.dir.cleanup()
+
+  def test_match(self):
+    library = Library(self.args)
+    library.add('alice', np.array([1.0, 0.0, 0.0]))
+    library.add('bob', np.array([0.0, 1.0, 0.0]))
+    voices = np.array([[0.1, 0.9, 0.0], [0.0, 0.0, 1.0], [0.9, 0.2, 0.0], [np.nan] * 3])
+    assert library.match(voices) == ['bob', None, 'alice', None]
+
+  def test_unique(self):
+    # two speakers like alice, only the closer one is her
+    library = Library(self.args)
+    library.add('alice', np.array([1.0, 0.0]))
+    assert library.match(np.array([[0.8, 0.3], [1.0, 0.05]])) == [None, 'alice']
+
+  def test_save(self):
+    library = Library(self.args)
+    library.add('alice', np.array([1.0, 0.0]), 10)
+    library.add('alice', np.array([0.0, 1.0]), 10)
+    library.add('bob', np.array([0.0, 1.0]))
+    library.save()
+    assert os.listdir(self.dir.name) == ['speakers.npz']
+
+    library = Library(self.args)
+    assert library.names == ['alice', 'bob']
+    assert library.weights.tolist() == [20, 1]
+    assert np.allclose(library.centroids[0], [0.5 ** 0.5, 0.5 ** 0.5])
+
+    library.remove('alice')
+    assert library.names == ['bob'] and library.centroids.shape == (1, 2)
@@ -0,0 +1,34 @@
+import os, tempfile, unittest
+
+from scribinator.manifest import Manifest
+
+class TestManifest(unittest.TestCase):
+  def test_manifest(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, 'manifest.json')
+      m = Manifest(path)
+      assert m.get('all.json') is None
+      m.set('all.json', 'abc')
+      m.set('segments/0.wav', 'def')
+      assert m.get('all.json') == 'abc'
+      assert not os.path.exists(path)
+      m.save()
+      m = Manifest(path)
+      assert m.get('segments/0.wav') == 'def'
+      assert os.listdir(tmp) == ['manifest.json']
+
+  def test_made_with(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, 'manifest.json')
+      m = Manifest(path)
+      made_with = {'audio': 'a1', 'span': [0, 2], 'model': {'model': 'base'}, 'params': {'engine': 'segments'}}
+      m.set('segments/0_transcript.json', 'abc', made_with)
+      m.save()
+      # compared on the fingerprint, with what made it kept alongside
+      m = Manifest(path)
+      assert m.get('segments/0_transcript.json') == 'abc'
+      assert m.made_with('segments/0_transcript.json') == made_with
+      assert m.made_with('missing') is None
+
+if __name__ == "__main__":
+  unittest.main()
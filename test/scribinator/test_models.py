@@ -110,6 +110,37 @@ class TestModels(unittest.TestCase):
       verify_models_behavior_with_errors(m)
       assert len(m.todo()) == len(m.names())
 
+  def test_emotion_source(self):
+    with fast({}) as audio, fast({'emotion_source': 'text'}) as text:
+      assert audio.source('emotions') == Models.sources['emotions']
+      assert text.source('emotions') == Models.text_sources['emotions']
+      assert text.source('transcribe') == Models.sources['transcribe']
+      # the two are different models, loaded and fingerprinted separately
+      assert audio.variant('emotions') != text.variant('emotions')
+      assert audio.fingerprint('emotions')['model'] != text.fingerprint('emotions')['model']
+
+  def test_int8(self):
+    torch = pytest.importorskip('torch')
+
+    class Linear(torch.nn.Linear):
+      """Like whisper's, a subclass torch would not quantize on its own"""
+
+    def load():
+      return torch.nn.Sequential(Linear(8, 4), torch.nn.ReLU(), torch.nn.Linear(4, 2))
+
+    with fast({'precision': 'int8'}) as m, patch.object(Models, 'loaded', {}):
+      with patch('scribinator.models.Models.load_transcribe', side_effect=load) as loader:
+        model = m.load('transcribe')
+        assert os.path.exists(m.quantized_path('transcribe'))
+        assert all(type(layer) is not torch.nn.Linear and not isinstance(layer, Linear) for layer in model[::2])
+        assert model(torch.zeros(1, 8)).shape == (1, 2)
+        assert m.fingerprint('transcribe')['precision'] == 'int8'
+
+        # the next process just loads the quantized copy
+        Models.loaded.clear()
+        assert m.load('transcribe')(torch.zeros(1, 8)).shape == (1, 2)
+        assert loader.call_count == 1
+
 if __name__ == "__main__":
   unittest.main()
 
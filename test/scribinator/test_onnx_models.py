@@ -0,0 +1,37 @@
+import tempfile, unittest
+from types import SimpleNamespace
+
+from scribinator.onnx_models import use_onnx, embedding_forward, SEGMENTATION
+
+class FakeNetwork:
+  def forward(self, waveforms, weights=None):
+    return 'torch'
+
+def fake_pipeline():
+  return SimpleNamespace(
+    _segmentation=SimpleNamespace(model=FakeNetwork()),
+    _embedding=SimpleNamespace(model_=FakeNetwork())
+  )
+
+class TestOnnxModels(unittest.TestCase):
+  def test_missing(self):
+    # nothing exported, so everything stays in torch
+    pipeline = fake_pipeline()
+    with tempfile.TemporaryDirectory() as tmp:
+      assert use_onnx(pipeline, tmp) == []
+    assert pipeline._segmentation.model.forward(None) == 'torch'
+
+  def test_unloadable(self):
+    pipeline = fake_pipeline()
+    with tempfile.TemporaryDirectory() as tmp:
+      with open(f'{tmp}/{SEGMENTATION}', 'w') as f: f.write('not a model')
+      assert use_onnx(pipeline, tmp) == []
+    assert pipeline._segmentation.model.forward(None) == 'torch'
+
+  def test_unweighted_embedding(self):
+    # pyannote probes the embedding model without weights, which only torch does the same way
+    model = FakeNetwork()
+    assert embedding_forward(model, None)('waveforms') == 'torch'
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,62 @@
+import os, os.path, tempfile, unittest
+
+from scribinator.pack import COMPACT, Pack
+
+class TestPack(unittest.TestCase):
+  def test_round_trip(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, 'segments.pack')
+      with Pack(path).writer() as add:
+        add('segments/0.wav', b'zero')
+        add('0_transcript.json', b'{"text": "hi"}')
+
+      # a fresh reader sees everything, at the offsets it claims
+      pack = Pack(path)
+      assert 'segments/0.wav' in pack and 'segments/1.wav' not in pack
+      assert pack.read('0_transcript.json') == b'{"text": "hi"}'
+      offset, length = pack.locate('segments/0.wav')
+      with open(path, 'rb') as f:
+        f.seek(offset)
+        assert f.read(length) == b'zero'
+
+      # appending keeps the old entries
+      with pack.writer() as add: add('segments/1.wav', b'one')
+      assert Pack(path).read('segments/0.wav') == b'zero'
+      assert Pack(path).read('segments/1.wav') == b'one'
+
+  def test_crash(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, 'segments.pack')
+      with Pack(path).writer() as add: add('a', b'aaa')
+      size = os.path.getsize(path)
+
+      # a write torn off part way leaves junk past the index the header points at
+      with open(path, 'ab') as f: f.write(b'half a clip')
+      assert Pack(path).read('a') == b'aaa'
+
+      # and the next writer just carries on after it
+      with Pack(path).writer() as add: add('b', b'bbb')
+      assert Pack(path).read('a') == b'aaa'
+      assert Pack(path).read('b') == b'bbb'
+
+  def test_compact(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, 'segments.pack')
+      with Pack(path).writer() as add:
+        add('a', b'a' * 1000)
+        add('b', b'b' * 1000)
+      # every rewrite of a leaves the old one behind, until the pack is compacted
+      for _ in range(3):
+        with Pack(path).writer() as add: add('a', b'A' * 1000)
+        assert Pack(path).dead() <= COMPACT * os.path.getsize(path)
+      assert os.path.getsize(path) < 4000
+      pack = Pack(path)
+      assert pack.read('a') == b'A' * 1000 and pack.read('b') == b'b' * 1000
+
+      pack.compact()
+      assert pack.dead() == 0
+      assert Pack(path).read('a') == b'A' * 1000 and Pack(path).read('b') == b'b' * 1000
+      assert os.listdir(tmp) == ['segments.pack']
+
+if __name__ == "__main__":
+  unittest.main()
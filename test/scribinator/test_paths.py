@@ -12,6 +12,7 @@ def test_init():
   assert p.path('segments') == os.path.join(r, 'segments')
   assert p.path('meta') == os.path.join(r, 'meta.json')
   assert p.path('audio') == os.path.join(r, 'all.mp3')
+  assert p.path('pcm') == os.path.join(r, 'all.npy')
   assert p.path('json') == os.path.join(r, 'all.json')
   assert p.path('html') == os.path.join(r, 'index.html')
 
@@ -20,7 +21,7 @@ def test_segment_audio_info_path():
   r = 'some/path/to/audiofile'
   p = Paths(args, r + '.mp3')
 
-  assert p.path('segment_audio', 10) == os.path.join(r, 'segments', '10.mp3')
+  assert p.path('segment_audio', 10) == os.path.join(r, 'segments', '10.wav')
   assert p.path('segment_info', 20) == os.path.join(r, 'segments', '20.json')
 
 def test_exceptions():
@@ -0,0 +1,12 @@
+import unittest
+
+from scribinator.pool import longest_first
+
+class TestPool(unittest.TestCase):
+  def test_longest_first(self):
+    assert longest_first([1.0, 5.0, 2.5, 5.0, 0.5], 2) == [[1, 3], [2, 0], [4]]
+    assert longest_first([3.0, 1.0], 0) == [[0], [1]]
+    assert longest_first([], 4) == []
+
+if __name__ == "__main__":
+  unittest.main()
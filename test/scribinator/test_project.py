@@ -9,9 +9,10 @@ class TestProject(unittest.TestCase):
     return os.path.join(os.path.dirname(__file__), 'demo_audio.m4a')
   @contextmanager
   def create_project(self):
-    # Create a temporary directory with our audio file in place
+    # Create a temporary directory with our audio file in place, so the project is made there
     self.tmp_dir = tempfile.TemporaryDirectory()
-    src = self.path_src()
+    src = os.path.join(self.tmp_dir.name, 'demo_audio.m4a')
+    shutil.copy(self.path_src(), src)
 
     # Create Project based on the path of the copied audio file
     args = argparse.Namespace(**{
@@ -22,6 +23,7 @@ class TestProject(unittest.TestCase):
       'when': "a time",
       'author': 'an author'
     })
+    self.src = src
     project = Project(args, src)
 
     yield project
@@ -32,9 +34,8 @@ class TestProject(unittest.TestCase):
   def create(self):
     # Create a temporary directory with our audio file in place
     self.tmp_dir = tempfile.TemporaryDirectory()
-    src = os.path.join(os.path.dirname(__file__), 'demo_audio.m4a')
-    # dst = os.path.join(self.tmp_dir.name, 'demo_audio.m4a')
-    # shutil.copy(src, dst)
+    src = os.path.join(self.tmp_dir.name, 'demo_audio.m4a')
+    shutil.copy(self.path_src(), src)
 
     # Create Project based on the path of the copied audio file
     args = argparse.Namespace(**{
@@ -49,8 +50,9 @@ class TestProject(unittest.TestCase):
 
   def test_meta(self):
     with self.create_project() as project:
+      st = os.stat(self.src)
       dt = datetime.datetime.fromtimestamp(
-        os.stat(self.path_src()).st_birthtime
+        getattr(st, 'st_birthtime', st.st_mtime)
       ).strftime('%Y-%m-%d %H:%M:%S')
       meta = project.meta()
       exp = {
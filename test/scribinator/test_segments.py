@@ -1,8 +1,153 @@
-import os, os.path, shutil, tempfile, unittest, argparse, datetime
+import io, json, os, os.path, shutil, tempfile, unittest, argparse, datetime, wave
 
+import numpy as np
+
+from scribinator.audio import npy_header, SAMPLE_RATE
+from scribinator.cache import Cache
 from scribinator.segments import Segments
-class TestProject(unittest.TestCase):
-  pass
+
+def fake_project(tmp, seconds=10, pack=False):
+  """A project folder with nothing but decoded audio in it"""
+  root = os.path.join(tmp, 'demo')
+  os.makedirs(os.path.join(root, 'segments'))
+  samples = np.sin(np.arange(seconds * SAMPLE_RATE) / 10).astype('<f4')
+  with open(os.path.join(root, 'all.npy'), 'wb') as f:
+    f.write(npy_header(len(samples)))
+    f.write(samples.tobytes())
+  args = argparse.Namespace(reset=False, models=tmp, pack=pack)
+  return Segments(args, root + '.m4a')
+
+class FakeScorer:
+  """Scores each clip as happy by its length"""
+  batch_size = 2
+  def score(self, clips):
+    return [[0, 0, 0, 0, 0, len(clip), 0] for clip in clips]
+
+class TestSegments(unittest.TestCase):
+  def test_merge(self):
+    turns = [(0, 1, 0), (1, 2, 0), (2, 3, 1), (5, 6, 1)]
+    assert [(s['start'], s['end'], s['speaker']) for s in Segments.merge(turns)] == [(0, 2, 0), (2, 6, 1)]
+    assert [(s['start'], s['end'], s['speaker']) for s in Segments.merge(turns, 1.0)] == [(0, 2, 0), (2, 3, 1), (5, 6, 1)]
+    assert [s['segment'] for s in Segments.merge(turns, 1.0)] == [0, 1, 2]
+
+  def test_extract(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      s = fake_project(tmp)
+      s.segments = Segments.merge([(0.5, 2.5, 0), (3, 3.25, 1), (4, 9, 0)])
+      s.extract()
+      for i, segment in enumerate(s.segments):
+        path = s.paths.path('segment_audio', i)
+        assert segment['path_audio'] == f'segments/{i}.wav'
+        with wave.open(path) as w:
+          assert w.getframerate() == SAMPLE_RATE
+          assert w.getnframes() == int(segment['end'] * SAMPLE_RATE) - int(segment['start'] * SAMPLE_RATE)
+      assert not any(p.endswith('.tmp') for p in os.listdir(s.paths.path('segments')))
+
+  def test_extract_pack(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      s = fake_project(tmp, pack=True)
+      s.segments = Segments.merge([(0.5, 2.5, 0), (4, 9, 1)])
+      s.extract()
+      assert os.listdir(s.paths.path('segments')) == []
+      for i, segment in enumerate(s.segments):
+        assert s.stored('segment_audio', i)
+        with wave.open(io.BytesIO(s.fetch('segment_audio', i))) as w:
+          assert w.getnframes() == int(segment['end'] * SAMPLE_RATE) - int(segment['start'] * SAMPLE_RATE)
+
+  def test_manifest(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      s = fake_project(tmp)
+      s.segments = Segments.merge([(0.5, 2.5, 0), (4, 9, 1)])
+      s.extract()
+      assert not any(s.outdated('segment_audio', i) for i in range(2))
+      assert s.manifest.made_with(s.result('segment_audio', 1)) == {'audio': s.audio_hash(), 'span': [4, 9]}
+      # only the segment that moved is redone
+      s.segments[1]['end'] = 8
+      assert not s.outdated('segment_audio', 0)
+      assert s.outdated('segment_audio', 1)
+      s.args.reset_stage = ['extract']
+      assert s.outdated('segment_audio', 0)
+
+  def test_turns_cache(self):
+    class Loaded(Exception): pass
+    def load(name): raise Loaded(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+      s = fake_project(tmp)
+      s.args.cache = os.path.join(tmp, 'cache')
+      s.fingerprint = lambda name, i=None: 'demo'
+      s.models.load = load
+      Cache(s.args, 'detect').put('demo', {'turns': [[0.5, 2.5, 0]], 'voices': None})
+      assert list(s.turns()) == [[0.5, 2.5, 0]]
+      # a reset finds the speakers anew rather than reading them back
+      s.args.reset_stage = ['detect']
+      with self.assertRaises(Loaded): list(s.turns())
+      s.args.reset_stage = []
+      s.args.reset = True
+      with self.assertRaises(Loaded): list(s.turns())
+
+  def test_transcribe_reset(self):
+    class CountingTranscriber:
+      batch_size = 2
+      calls = 0
+      def transcribe(self, clips):
+        CountingTranscriber.calls += 1
+        return [{'language': 'en', 'text': f' {len(clip)}'} for clip in clips]
+
+    with tempfile.TemporaryDirectory() as tmp:
+      s = fake_project(tmp)
+      s.args.cache = os.path.join(tmp, 'cache')
+      s.segments = Segments.merge([(0.5, 2.5, 0), (4, 9, 1)])
+      s.transcriber = CountingTranscriber
+      s.extract()
+      s.transcribe()
+      assert CountingTranscriber.calls == 1
+      # a reset transcribes anew, rather than reusing what the cache heard before
+      s.args.reset_stage = ['transcribe']
+      s.transcribe()
+      assert CountingTranscriber.calls == 2
+      s.args.reset_stage = []
+      s.args.reset = True
+      s.transcribe()
+      assert CountingTranscriber.calls == 3
+      # and without one, the transcripts are kept
+      s.args.reset = False
+      s.transcribe()
+      assert CountingTranscriber.calls == 3
+
+  def test_emotions(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      s = fake_project(tmp)
+      s.segments = Segments.merge([(0.5, 2.5, 0), (4, 9, 1)])
+      s.scorer = FakeScorer
+      s.emotions()
+      assert [x['emotions'] for x in s.segments] == [[0, 0, 0, 0, 0, 32000, 0], [0, 0, 0, 0, 0, 80000, 0]]
+      assert [x['emotion'] for x in s.segments] == [5, 5]
+      # already scored, so nothing is loaded the second time
+      s.scorer = None
+      s.emotions()
+      assert s.segments[1]['emotions'][5] == 80000
+
+  def test_stream(self):
+    class FakeTranscriber:
+      batch_size = 2
+      def transcribe(self, clips):
+        return [{'language': 'en', 'text': f' {len(clip)}'} for clip in clips]
+
+    with tempfile.TemporaryDirectory() as tmp:
+      s = fake_project(tmp, pack=True)
+      s.turns = lambda: iter([(0.5, 1.5, 0), (1.5, 2.5, 0), (3, 3.25, 1), (4, 9, 0)])
+      s.transcriber = FakeTranscriber
+      s.scorer = FakeScorer
+      s.stream()
+      assert [(x['start'], x['end'], x['speaker']) for x in s.segments] == [(0.5, 2.5, 0), (3, 3.25, 1), (4, 9, 0)]
+      for i, segment in enumerate(s.segments):
+        assert s.stored('segment_audio', i)
+        assert segment['transcript'] == f" {len(s.samples(i))}"
+        assert json.loads(s.fetch('segment_transcript', i))['language'] == 'en'
+        assert segment['emotions'][5] == len(s.samples(i))
+      with open(s.paths.path('json')) as f:
+        assert json.load(f) == [{k: x[k] for k in ['segment', 'start', 'end', 'speaker']} for x in s.segments]
 
 if __name__ == "__main__":
   unittest.main()
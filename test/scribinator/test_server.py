@@ -0,0 +1,42 @@
+import os, sys, types, argparse, threading, tempfile
+from multiprocessing.connection import Listener
+from unittest.mock import patch
+
+from ege.logging import setup_logging
+from scribinator.server import Server, Client
+
+class Fake:
+  """Stands in for Scribinator so no models are needed"""
+  runs = []
+
+  def __init__(self, args, path):
+    self.args = args
+    self.path = path
+
+  def run(self):
+    if self.path.endswith('bad.m4a'): raise RuntimeError("boom")
+    setup_logging().info(f"ran {self.path}")
+    Fake.runs.append((self.path, self.args.title))
+
+def serve_once(server, listener):
+  with listener.accept() as conn:
+    server.handle(conn)
+
+def submit(path):
+  with tempfile.TemporaryDirectory() as tmp:
+    args = argparse.Namespace(socket=os.path.join(tmp, 's.sock'), models=tmp, title='a title', files=[path], server=True)
+    server = Server(args)
+    with Listener(args.socket, family='AF_UNIX') as listener:
+      t = threading.Thread(target=serve_once, args=(server, listener))
+      t.start()
+      ok = Client(args).submit(path)
+      t.join()
+  return ok
+
+def test_submit():
+  fake = types.ModuleType('scribinator.scribinator')
+  fake.Scribinator = Fake
+  with patch.dict(sys.modules, {'scribinator.scribinator': fake}):
+    assert submit('good.m4a')
+    assert Fake.runs[-1] == (os.path.abspath('good.m4a'), 'a title')
+    assert not submit('bad.m4a')
@@ -0,0 +1,54 @@
+import unittest
+
+from scribinator.spans import Spans
+
+class TestSpans(unittest.TestCase):
+  def test_same(self):
+    spans = Spans()
+    spans.add(10.0, 12.0, {'language': 'en', 'text': ' hello'})
+    assert spans.find(10.1, 11.9) == {'language': 'en', 'text': ' hello'}
+    assert spans.find(9.0, 12.0) is None
+    # a newer transcript of the same span wins
+    spans.add(10.05, 12.0, {'language': 'en', 'text': ' hello there'})
+    assert len(spans.entries) == 1
+    assert spans.find(10.0, 12.0)['text'] == ' hello there'
+
+  def test_words(self):
+    # two old turns heard word by word, and a new turn across both of them
+    spans = Spans()
+    spans.add(0.0, 2.0, {'language': 'en', 'text': ' a b', 'words': [
+      {'word': ' a', 'start': 0.2, 'end': 0.6}, {'word': ' b', 'start': 1.2, 'end': 1.6}]})
+    spans.add(2.0, 4.0, {'language': 'en', 'text': ' c', 'words': [{'word': ' c', 'start': 0.5, 'end': 0.9}]})
+    j = spans.find(1.0, 4.0)
+    assert j['text'] == ' b c'
+    assert [(w['word'], round(w['start'], 3)) for w in j['words']] == [(' b', 0.2), (' c', 1.5)]
+    # nobody has heard past 4 seconds yet
+    assert spans.find(1.0, 6.0) is None
+
+  def test_overlapping(self):
+    # an old diarization heard [0, 4) in one go, a newer one in two turns
+    spans = Spans()
+    spans.add(0.0, 4.0, {'language': 'en', 'text': ' a b', 'words': [
+      {'word': ' a', 'start': 0.2, 'end': 0.6}, {'word': ' b', 'start': 2.2, 'end': 2.6}]})
+    spans.add(0.0, 2.0, {'language': 'en', 'text': ' a', 'words': [{'word': ' a', 'start': 0.2, 'end': 0.6}]})
+    spans.add(2.0, 4.0, {'language': 'en', 'text': ' b', 'words': [{'word': ' b', 'start': 0.2, 'end': 0.6}]})
+    assert len(spans.entries) == 3
+    assert spans.find(0.0, 3.0)['text'] == ' a b'
+
+  def test_gap(self):
+    # the overlapping entries add up to more than the span, but leave 0.3 seconds unheard
+    spans = Spans()
+    for start, end in [(0.0, 1.0), (0.0, 1.6), (1.9, 2.5)]:
+      spans.add(start, end, {'language': 'en', 'text': '', 'words': []})
+    assert spans.find(0.0, 2.5) is None
+    assert Spans.covered(spans.entries, 0.0, 2.5) == 1.6 + 0.6
+    # a gap within the tolerance is fine
+    spans.add(1.7, 1.9, {'language': 'en', 'text': '', 'words': []})
+    assert spans.find(0.0, 2.5) is not None
+
+  def test_no_words(self):
+    spans = Spans([{'start': 0.0, 'end': 2.0, 'language': 'en', 'text': ' a', 'words': None}])
+    assert spans.find(0.0, 1.0) is None
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,54 @@
+import threading, time, unittest
+
+from scribinator.stream import stream
+
+class TestStream(unittest.TestCase):
+  def test_stages(self):
+    def double(inbox):
+      for x in inbox: yield 2 * x
+    def plus_one(inbox):
+      for x in inbox: yield x + 1
+    assert list(stream(range(100), double, plus_one, size=2)) == [2 * x + 1 for x in range(100)]
+    assert list(stream([])) == []
+
+  def test_overlap(self):
+    # the first item is out the far end while the source is still going
+    produced = []
+    def source():
+      for x in range(5):
+        produced.append(x)
+        time.sleep(0.05)
+        yield x
+    def stage(inbox):
+      for x in inbox: yield len(produced)
+    assert next(iter(stream(source(), stage))) < 5
+
+  def test_batches(self):
+    ready, release = threading.Event(), threading.Event()
+    def source():
+      yield from range(3)
+      ready.set()
+      release.wait()
+      yield from range(3, 5)
+    def stage(inbox):
+      ready.wait()
+      for batch in inbox.batches(10):
+        release.set()
+        yield batch
+    # the first batch does not wait to fill up
+    batches = list(stream(source(), stage))
+    assert batches[0] == [0, 1, 2]
+    assert sum(batches, []) == list(range(5))
+
+  def test_error(self):
+    def stage(inbox):
+      for x in inbox:
+        if x == 3: raise ValueError('bad')
+        yield x
+    got = []
+    with self.assertRaises(ValueError):
+      for x in stream(range(1000), stage, size=2): got.append(x)
+    assert got == [0, 1, 2]
+
+if __name__ == "__main__":
+  unittest.main()
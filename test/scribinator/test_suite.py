@@ -0,0 +1,74 @@
+import os, shutil, tempfile, unittest, wave
+from argparse import Namespace
+
+import pytest
+np = pytest.importorskip('numpy')
+
+from scribinator.suite import (
+  BUDGET, SAMPLE_RATE, STAGES, EchoTranscriber, LoudnessScorer, Suite, heavy, import_times, parse_importtime, regressions, synthetic
+)
+
+class TestSuite(unittest.TestCase):
+  def test_synthetic(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, 'synthetic.wav')
+      turns = synthetic(path, speakers=3, turns=10)
+      assert len(turns) == 10
+      assert {speaker for _, _, speaker in turns} <= {0, 1, 2}
+      # turns never overlap, always have silence between them, and change speaker
+      for (_, end, a), (start, _, b) in zip(turns, turns[1:]):
+        assert start > end and a != b
+      with wave.open(path) as w:
+        assert w.getframerate() == SAMPLE_RATE
+        assert w.getnframes() / SAMPLE_RATE > turns[-1][1]
+      # the same seed makes the same recording
+      assert synthetic(path, speakers=3, turns=10) == turns
+
+  def test_stand_ins(self):
+    clips = [np.zeros(SAMPLE_RATE), np.full(SAMPLE_RATE // 2, 0.5)]
+    assert [r['text'] for r in EchoTranscriber().transcribe(clips)] == [' 1.00 seconds', ' 0.50 seconds']
+    assert [s[4] for s in LoudnessScorer().score(clips)] == [0, 50]
+
+  def test_regressions(self):
+    baseline = {'merge': 0.100, 'extract': 0.001, 'run': 1.0}
+    results = {'merge': 0.130, 'extract': 0.002, 'run': 1.1, 'new': 5.0}
+    # extract doubled, but by less than the timer can tell
+    assert regressions(baseline, results, 20) == {'merge': (0.100, 0.130)}
+    assert regressions(baseline, results, 50) == {}
+
+  def test_parse_importtime(self):
+    report = '\n'.join([
+      'import time: self [us] | cumulative | imported package',
+      'import time:       120 |        120 |   _io',
+      'import time:      2000 |     900000 |   torch._C',
+      'import time:      1500 |    1500000 | torch',
+      '2024-01-01 | 0s | INFO | not an import',
+    ])
+    times = parse_importtime(report)
+    assert times == {'_io': 0.00012, 'torch._C': 0.9, 'torch': 1.5}
+    assert heavy(times) == ['torch']
+
+  def test_lazy_imports(self):
+    # the pipeline only loads the heavy libraries in the steps that need them
+    assert heavy(import_times('scribinator.scribinator')) == []
+
+  @pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="needs ffmpeg to make the project")
+  def test_rerender(self):
+    # a project with every result there already renders without loading torch and friends -
+    # the time gets plenty of headroom here, a busy machine is no regression
+    suite = Suite(Namespace(), repeat=1, turns=8)
+    results = suite.run(['rerender'])
+    assert list(results) == ['rerender']
+    assert suite.loaded == []
+    assert results['rerender'] < 4 * BUDGET
+
+  @pytest.mark.slow
+  def test_run(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      suite = Suite(Namespace(), repeat=1, turns=8)
+      results = suite.run()
+      assert list(results) == STAGES and all(t > 0 for t in results.values())
+      assert suite.budget(results) == []
+      path = os.path.join(tmp, 'baseline.json')
+      Suite.save(path, results)
+      assert suite.check(path, results) == {}
@@ -0,0 +1,86 @@
+import unittest
+
+import pytest
+np = pytest.importorskip('numpy')
+
+from scribinator.transcriber import log_mel, combine, align_words, share_words, Transcriber, SAMPLE_RATE, WINDOW, GAP
+
+class FakeModel:
+  """Stands in for whisper where only model.transcribe() is used"""
+  def __init__(self):
+    self.calls = []
+
+  def transcribe(self, clip, word_timestamps=False, **kwargs):
+    self.calls.append(len(clip))
+    if not word_timestamps: return {'language': 'en', 'text': f' {len(clip)}'}
+    # one word a second, the second after the start of each stretch of sound
+    loud = np.flatnonzero(np.diff(np.concatenate([[0], clip != 0]).astype(int)) == 1) / SAMPLE_RATE
+    words = [{'word': f' w{k}', 'start': t, 'end': t + 0.2} for k, t in enumerate(loud)]
+    return {'language': 'en', 'segments': [{'words': words}]}
+
+class TestTranscriber(unittest.TestCase):
+  def test_log_mel(self):
+    # each row is exactly what model.transcribe() would give the encoder
+    torch = pytest.importorskip('torch')
+    whisper = pytest.importorskip('whisper')
+    rng = np.random.default_rng(0)
+    clips = [rng.standard_normal(int(SAMPLE_RATE * s)).astype(np.float32) * 0.1 for s in (0.5, 3, 12)]
+    mel = log_mel(clips)
+    assert mel.shape == (3, 80, 3000)
+    for i, clip in enumerate(clips):
+      full = whisper.log_mel_spectrogram(clip, 80, padding=whisper.audio.N_SAMPLES)
+      expected = whisper.pad_or_trim(full[:, :len(clip) // whisper.audio.HOP_LENGTH], 3000)
+      assert torch.allclose(mel[i], expected, atol=1e-5)
+
+  def test_order(self):
+    # long clips and failed passes go the slow way, and the results stay in order
+    class Batched(Transcriber):
+      def decode(self, batch):
+        self.sizes.append(len(batch))
+        return [{'language': 'en', 'text': 'short'} if len(clip) > 100 else None for clip in batch]
+
+    model = FakeModel()
+    t = Batched(model, 2)
+    t.sizes = []
+    clips = [np.zeros(n, dtype=np.float32) for n in (1000, (WINDOW + 1) * SAMPLE_RATE, 50, 2000)]
+    texts = [r['text'] for r in t.transcribe(clips)]
+    assert texts == ['short', f' {(WINDOW + 1) * SAMPLE_RATE}', ' 50', 'short']
+    assert t.sizes == [2, 1]
+    assert sorted(model.calls) == [50, (WINDOW + 1) * SAMPLE_RATE]
+
+  def test_combine(self):
+    second = SAMPLE_RATE
+    assert combine([2 * second] * 5, 7 * second, second // 2) == [[0, 1, 2], [3, 4]]
+    assert combine([40 * second, second, second, 40 * second]) == [[0], [1, 2], [3]]
+
+  def test_align_words(self):
+    words = [{'word': w, 'start': s, 'end': s + 0.2} for w, s in [(' a', 0.1), (' b', 1.1), (' c', 1.7), (' d', 1.9), (' e', 2.8)]]
+    # by overlap first (d straddles both but is mostly in the second), then the nearest
+    assert align_words(words, [0.0, 2.0], [1.5, 3.0]) == [' a b', ' c d e']
+    assert align_words(words, [], []) == []
+
+  def test_share_words(self):
+    words = [{'word': w, 'start': s, 'end': s + 0.5} for w, s in [(' a', 0.5), (' b', 2.5)]]
+    assert share_words(words, [0.0, 2.0], [1.5, 3.0]) == [
+      [{'word': ' a', 'start': 0.5, 'end': 1.0}],
+      [{'word': ' b', 'start': 0.5, 'end': 1.0}],
+    ]
+
+  def test_transcribe_whole(self):
+    model = FakeModel()
+    clip = np.zeros(10 * SAMPLE_RATE, dtype=np.float32)
+    clip[SAMPLE_RATE:2 * SAMPLE_RATE] = clip[6 * SAMPLE_RATE:7 * SAMPLE_RATE] = 1
+    results = Transcriber(model).transcribe_whole(clip, [0, 5], [4, 10])
+    assert [r['text'] for r in results] == [' w0', ' w1']
+    assert model.calls == [len(clip)]
+
+  def test_transcribe_window(self):
+    # each clip gets back just the word said in it
+    model = FakeModel()
+    t = Transcriber(model, combine=True)
+    clips = [np.ones(2 * SAMPLE_RATE, dtype=np.float32) for _ in range(3)]
+    assert [r['text'] for r in t.transcribe(clips)] == [' w0', ' w1', ' w2']
+    assert model.calls == [int((6 + 2 * GAP) * SAMPLE_RATE)]
+
+if __name__ == "__main__":
+  unittest.main()
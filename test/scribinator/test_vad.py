@@ -0,0 +1,45 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from scribinator.vad import detect_speech, Speech, PAD
+
+class Samples:
+  """Stands in for Audio, serving samples from memory"""
+  def __init__(self, samples, sample_rate=16000):
+    self.samples = samples
+    self.sample_rate = sample_rate
+    self.duration = len(samples) / sample_rate
+
+  def read(self, start, end):
+    return self.samples[int(start * self.sample_rate):int(end * self.sample_rate)][None, :]
+
+def synthetic(layout, sample_rate=16000):
+  """Quiet noise, with voice-band tones wherever layout says there is speech"""
+  rng = np.random.default_rng(0)
+  parts = []
+  for seconds, speech in layout:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    x = 0.001 * rng.standard_normal(len(t))
+    if speech: x += 0.3 * np.sin(2 * np.pi * 440 * t) + 0.2 * np.sin(2 * np.pi * 1250 * t)
+    parts.append(x)
+  return Samples(np.concatenate(parts).astype(np.float32), sample_rate)
+
+def test_detect_speech():
+  audio = synthetic([(2, False), (3, True), (3, False), (2, True), (1, False)])
+  found = detect_speech(audio, chunk=100)
+  assert len(found) == 2
+  for (s, e), (es, ee) in zip(found, [(2, 5), (8, 10)]):
+    assert abs(s - (es - PAD)) < 0.1
+    assert abs(e - (ee + PAD)) < 0.1
+
+def test_detect_silence():
+  assert detect_speech(synthetic([(5, False)])) == []
+
+def test_pieces():
+  speech = Speech(synthetic([(12, False)]), [(2.0, 5.0), (8.0, 10.0)])
+  assert speech.duration == 5.0
+  assert speech.pieces(0, 2) == [(2.0, 4.0)]
+  assert speech.pieces(2, 4) == [(4.0, 5.0), (8.0, 9.0)]
+  assert speech.pieces(4, 5) == [(9.0, 10.0)]
+  assert speech.read(2, 4).shape == (1, 2 * 16000)